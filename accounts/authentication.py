@@ -0,0 +1,135 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+VERSION_KEY = 'auth_token:user:{}'
+
+
+#A number per user in the shared cache, bumped whenever that user's tokens
+#or account change. Entries cached under an older number are not used.
+def user_token_version(user_id):
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        #Start from the clock so a lost version key never brings back old entries
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_token_version(user_id):
+    key = VERSION_KEY.format(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_user_tokens(user_id):
+    """
+    Stop serving the user's cached tokens, in this and every other process.
+
+    Called by the signals in accounts.signals. Code that changes users
+    without signals, e.g. `User.objects.filter(...).update(is_active=False)`,
+    must call it for each user, otherwise the change is only seen once the
+    entries expire after AUTH_TOKEN_CACHE_TTL seconds.
+    """
+    token_cache.invalidate_user(user_id)
+    #Bump once the change is committed, so a request racing it cannot cache the old rows under the new number
+    transaction.on_commit(lambda: bump_user_token_version(user_id))
+
+
+class TokenCache:
+    """
+    Bounded LRU of token key -> (user, token), each entry living AUTH_TOKEN_CACHE_TTL seconds.
+
+    The entries are per process, each one checked against the user's version
+    in the shared Django cache on lookup, so invalidation (see
+    invalidate_user_tokens) reaches every worker when CACHES is shared between
+    them. The TTL bounds how long a change made without invalidation is missed.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        #The shared version is read outside the lock, it can be a network round trip
+        fresh = (
+            entry is not None and entry[0] > time.monotonic()
+            and entry[1] == user_token_version(entry[2].pk)
+        )
+        with self._lock:
+            if not fresh:
+                if entry is not None and self._entries.get(key) is entry:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        _, _, user, token = entry
+        #Views may set attributes on request.user, every request gets its own instance
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        return user, token
+
+    def set(self, key, user, token):
+        #A change committed between loading the rows and this read is only caught by the TTL
+        version = user_token_version(user.pk)
+        expires = time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL
+        with self._lock:
+            self._entries[key] = (expires, version, copy.copy(user), copy.copy(token))
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def invalidate_key(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in [key for key, (_, _, user, _) in self._entries.items() if user.pk == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that answers repeat requests from token_cache instead of the database."""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        #Unknown keys and inactive users raise here and are never cached
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
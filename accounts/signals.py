@@ -0,0 +1,30 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_user_tokens
+from .models import User
+
+
+# Logout (djoser deletes the user's tokens) and revoked tokens
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    invalidate_user_tokens(instance.user_id)
+
+
+# Deactivation, role and password changes must not be served from the cache.
+# Logging in only stamps last_login, which leaves the cached tokens valid.
+# Queryset update() sends no signals, call invalidate_user_tokens() after it.
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_changed_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_user_tokens(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, user, **kwargs):
+    if user is not None:
+        invalidate_user_tokens(user.pk)
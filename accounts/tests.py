@@ -1,3 +1,44 @@
-from django.test import TestCase
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from .authentication import bump_user_token_version, invalidate_user_tokens, token_cache
+from .models import User
+
+
+class TokenCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = User.objects.create_user('staff', password='x', role='staff')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def me(self):
+        return self.client.get('/accounts/me/')
+
+    def test_repeat_requests_are_served_from_the_cache(self):
+        self.assertEqual(self.me().status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me().status_code, 200)
+
+    def test_version_bumped_by_another_process(self):
+        self.me()
+        #Another worker changed the user, only the shared version tells this one
+        bump_user_token_version(self.user.pk)
+        with self.assertNumQueries(1):
+            self.me()
+
+    def test_bulk_update_with_invalidation(self):
+        self.me()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            invalidate_user_tokens(self.user.pk)
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_login_keeps_the_cached_tokens(self):
+        self.me()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            self.me()
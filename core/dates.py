@@ -0,0 +1,16 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def day_bounds(start=None, end=None):
+    """
+    Aware datetimes for the local days `start` to `end` inclusive, as
+    `(lower, upper)` to filter with `created_at__gte=lower, created_at__lt=upper`.
+
+    Unlike `created_at__date`, a range leaves the column bare, so its index
+    can be used. Either date may be None for an open end.
+    """
+    lower = timezone.make_aware(datetime.combine(start, time.min)) if start else None
+    upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)) if end else None
+    return lower, upper
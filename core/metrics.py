@@ -0,0 +1,322 @@
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  #Windows
+    fcntl = None
+    import msvcrt
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+
+#name -> (type, help, histogram buckets)
+METRICS = {
+    'http_requests_total': ('counter', "Requests handled, by view and status code", None),
+    'http_request_duration_seconds': ('histogram', "Time to send the response, streamed bodies included, by view", LATENCY_BUCKETS),
+    'db_queries_per_request': ('histogram', "SQL queries run while handling a request, by view", QUERY_BUCKETS),
+    'orders_created_total': ('counter', "Orders committed", None),
+    'order_cancellations_total': ('counter', "Orders cancelled, their stock was put back", None),
+    'stock_outs_total': ('counter', "Orders rejected for insufficient stock", None),
+    'invoice_pdf_renders_total': ('counter', "Invoice PDFs rendered (cache misses)", None),
+    'export_size_bytes': ('histogram', "Size of report exports, by report and format", SIZE_BUCKETS),
+    'cache_hits_total': ('counter', "Cache hits, by cache", None),
+    'cache_misses_total': ('counter', "Cache misses, by cache", None),
+}
+
+
+def cache_stats():
+    """Hit and miss counts of this process's caches, by cache name."""
+    from accounts.authentication import token_cache
+    from sales.cache import dashboard_cache_stats
+    from sales.invoices import invoice_cache
+
+    return {
+        'auth_token': token_cache.stats(),
+        'dashboard': dashboard_cache_stats(),
+        'invoice_pdf': invoice_cache.stats(),
+    }
+
+
+ARCHIVE = 'archive.json'
+
+
+@contextmanager
+def _directory_lock(directory):
+    """Exclusive lock between the processes sharing METRICS_DIR."""
+    with open(directory / '.lock', 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name != 'posix':
+        return True  #No safe liveness check, such files are folded once the pid is reused
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  #Alive, owned by another user
+    return True
+
+
+def _merge(counters, histograms, data):
+    """Add the values of one file's `data` into the `counters` and `histograms` dicts."""
+    for name, labels, value in data['counters']:
+        key = (name, tuple(tuple(label) for label in labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, buckets, total, count in data['histograms']:
+        key = (name, tuple(tuple(label) for label in labels))
+        merged = histograms.setdefault(key, [[0] * len(buckets), 0, 0])
+        merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+        merged[1] += total
+        merged[2] += count
+
+
+def _dump(counters, histograms):
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, *histogram] for (name, labels), histogram in histograms.items()],
+    }
+
+
+def _write(path, data):
+    #Write then rename so a scrape never reads a half written file
+    tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _fold(directory):
+    """Add the files of processes that are gone to archive.json and remove them, under the directory lock."""
+    files = {}  #pid -> [(start, path)]
+    for path in directory.glob('*-*.json'):
+        pid, _, start = path.stem.partition('-')
+        if pid.isdigit() and start.isdigit():
+            files.setdefault(int(pid), []).append((int(start), path))
+
+    dead = []
+    for pid, entries in files.items():
+        entries.sort()
+        #Older files under a pid that is in use again belong to a process that is gone
+        dead += [path for _, path in entries[:-1]]
+        if not _process_alive(pid):
+            dead.append(entries[-1][1])
+    if not dead:
+        return
+
+    counters, histograms = {}, {}
+    for path in [directory / ARCHIVE, *dead]:
+        data = _read(path)
+        if data is not None:
+            _merge(counters, histograms, data)
+    _write(directory / ARCHIVE, _dump(counters, histograms))
+    for path in dead:
+        path.unlink(missing_ok=True)
+
+
+class Metrics:
+    """
+    Counters and histograms of this process, shared with the others through files.
+
+    Each process writes its values to its own `<pid>-<start>.json` in
+    METRICS_DIR, at most every METRICS_FLUSH_INTERVAL seconds and when it
+    exits; collect() adds up every file, so /metrics reports all workers
+    whichever of them answers. Files of processes that are gone are folded
+    into archive.json when a process starts and on every scrape, so counters
+    never go down and the directory only holds one file per live process.
+    With METRICS_ENABLED off nothing is recorded or written.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        #Forked workers start from zero with their own file
+        self._path_name = f'{self._pid}-{time.time_ns()}.json'
+        self._counters = {}    #(name, labels) -> value
+        self._histograms = {}  #(name, labels) -> [count per bucket, sum, count]
+        self._dirty = False
+        self._flusher = None
+
+    def inc(self, name, amount=1, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_process()
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._dirty = True
+
+    def observe(self, name, value, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_process()
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(buckets), 0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+            self._dirty = True
+
+    def _check_process(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_periodically, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        pid = self._pid
+        #A new process cleans up after the ones it replaces
+        self.fold_dead_processes()
+        while pid == os.getpid():
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            if self._dirty:
+                self.flush()
+
+    @property
+    def directory(self):
+        return Path(settings.METRICS_DIR)
+
+    def flush(self):
+        """Write this process's values to its file."""
+        if not settings.METRICS_ENABLED:
+            return
+        stats = cache_stats()
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            data = _dump(self._counters, self._histograms)
+            self._dirty = False
+            path = self.directory / self._path_name
+        for cache, values in stats.items():
+            data['counters'].append(['cache_hits_total', [['cache', cache]], values['hits']])
+            data['counters'].append(['cache_misses_total', [['cache', cache]], values['misses']])
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        _write(path, data)
+
+    def fold_dead_processes(self):
+        """Add the files of processes that are gone to archive.json and remove them."""
+        directory = self.directory
+        directory.mkdir(parents=True, exist_ok=True)
+        with _directory_lock(directory):
+            _fold(directory)
+
+    def collect(self):
+        """Values of every process, as `(counters, histograms)` dicts keyed by (name, labels)."""
+        self.flush()
+        directory = self.directory
+        directory.mkdir(parents=True, exist_ok=True)
+        counters = {}
+        histograms = {}
+        #Under the lock, a file being folded is never read both on its own and in the archive
+        with _directory_lock(directory):
+            _fold(directory)
+            for path in directory.glob('*.json'):
+                data = _read(path)
+                if data is not None:
+                    _merge(counters, histograms, data)
+        return counters, histograms
+
+
+metrics = Metrics()
+
+
+@atexit.register
+def _flush_on_exit():
+    if metrics._dirty and metrics._pid == os.getpid():
+        try:
+            metrics.flush()
+        except Exception:
+            pass  #Settings or the directory may be gone at interpreter exit
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    counters, histograms = metrics.collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+            continue
+        for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_labels(labels, le=_number(bound))} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {count}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+
+    #Ratios from the summed counts, the per process ratios cannot be added up
+    lines.append('# HELP cache_hit_ratio Share of cache lookups that were hits, by cache')
+    lines.append('# TYPE cache_hit_ratio gauge')
+    for (metric, labels), hits in sorted(counters.items()):
+        if metric != 'cache_hits_total':
+            continue
+        lookups = hits + counters.get(('cache_misses_total', labels), 0)
+        if lookups:
+            lines.append(f'cache_hit_ratio{_labels(labels)} {_number(round(hits / lookups, 4))}')
+    return '\n'.join(lines) + '\n'
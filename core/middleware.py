@@ -0,0 +1,270 @@
+import cProfile
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+#Literals and IN lists vary between calls of the same query, fold them away to group duplicates
+_IN_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    sql = _LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def view_name(view_func, method):
+    """`OrderViewSet.export_orders` for viewset actions, `DashboardView.get` for views, the function name otherwise."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__qualname__', repr(view_func))
+    method = method.lower()
+    actions = getattr(view_func, 'actions', None) or {}  #Viewsets map HTTP methods to actions
+    return f"{cls.__name__}.{actions.get(method, method)}"
+
+
+class QueryRecorder:
+    """execute_wrapper counting queries and their time, per normalized statement."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[normalize_sql(sql)] += 1
+
+    def duplicates(self, threshold):
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+class QueryCounter:
+    """execute_wrapper only counting queries."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class ViewStats:
+    """Running totals per view name, for the process handling the requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, name, duration, queries, sql_duration, duplicated):
+        with self._lock:
+            stats = self._views.setdefault(name, {
+                'requests': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'queries': 0, 'sql_ms': 0.0, 'duplicate_requests': 0,
+            })
+            stats['requests'] += 1
+            stats['total_ms'] += duration * 1000
+            stats['max_ms'] = max(stats['max_ms'], duration * 1000)
+            stats['queries'] += queries
+            stats['sql_ms'] += sql_duration * 1000
+            stats['duplicate_requests'] += bool(duplicated)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._views.items()}
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+
+view_stats = ViewStats()
+
+
+class _ClosingStream:
+    """Streaming content calling `on_close` once, when it is used up or closed."""
+
+    def __init__(self, content, on_close):
+        self._content = content
+        self._on_close = on_close
+
+    def __iter__(self):
+        try:
+            yield from self._content
+        finally:
+            self.close()
+
+    def close(self):
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
+
+
+def when_sent(response, finish):
+    """
+    Call `finish` once the response is sent: now, or for a streaming response
+    when its body has been read, so what it queries while streaming counts.
+    """
+    #Async bodies are iterated by the server elsewhere, those are measured up to the first byte
+    if response.streaming and not getattr(response, 'is_async', False):
+        #StreamingHttpResponse also calls close() when the client goes away early
+        response.streaming_content = _ClosingStream(response.streaming_content, finish)
+    else:
+        finish()
+    return response
+
+
+#cProfile can only run one profiler at a time, sampled requests take turns
+_profiler_lock = threading.Lock()
+
+
+class ProfilingMiddleware:
+    """
+    Times every request and counts its SQL queries, reported per view.
+
+    Adds a Server-Timing header (total, db and app time up to the headers)
+    and logs requests slower than PROFILING_SLOW_REQUEST_MS or running the
+    same statement PROFILING_DUPLICATE_QUERY_THRESHOLD times or more, which
+    usually means an N+1. Streaming responses are measured until their body
+    has been sent. With PROFILING_CPROFILE_SAMPLE_RATE above 0 that share of
+    requests runs under cProfile, up to the first byte, and slow ones are
+    dumped to PROFILING_CPROFILE_DIR.
+
+    Only installed when PROFILING_ENABLED is set.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        profiler = None
+        if random.random() < settings.PROFILING_CPROFILE_SAMPLE_RATE and _profiler_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+
+        #Left open for a streaming body, the queries it runs while being sent are recorded too
+        stack = ExitStack()
+        started = time.perf_counter()
+        try:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+            first_byte = time.perf_counter() - started
+
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={first_byte * 1000:.1f}',
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"',
+                f'app;dur={(first_byte - recorder.duration) * 1000:.1f}',
+            ])
+            if profiler is not None and first_byte * 1000 >= settings.PROFILING_SLOW_REQUEST_MS:
+                self.dump(profiler, getattr(request, '_view_name', None) or 'unresolved', first_byte)
+        except BaseException:
+            stack.close()
+            raise
+        finally:
+            if profiler is not None:
+                _profiler_lock.release()
+
+        def finish():
+            stack.close()
+            duration = time.perf_counter() - started
+            name = getattr(request, '_view_name', None) or 'unresolved'
+            duplicated = recorder.duplicates(settings.PROFILING_DUPLICATE_QUERY_THRESHOLD)
+            view_stats.record(name, duration, recorder.count, recorder.duration, duplicated)
+            self.report(request, name, duration, recorder, duplicated)
+
+        return when_sent(response, finish)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_name = view_name(view_func, request.method)
+
+    def report(self, request, name, duration, recorder, duplicated):
+        slow = duration * 1000 >= settings.PROFILING_SLOW_REQUEST_MS
+        level = logging.WARNING if slow or duplicated else logging.DEBUG
+        if not logger.isEnabledFor(level):
+            return
+        message = "%s %s (%s): %.1f ms, %d queries in %.1f ms"
+        args = [request.method, request.path, name, duration * 1000, recorder.count, recorder.duration * 1000]
+        for sql, count in duplicated:
+            message += "\n  %dx %s"
+            args += [count, sql[:300]]
+        logger.log(level, message, *args)
+
+    def dump(self, profiler, name, duration):
+        directory = Path(settings.PROFILING_CPROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        profiler.dump_stats(directory / f"{stamp}-{name}-{duration * 1000:.0f}ms.prof")
+
+        #Keep only the newest PROFILING_CPROFILE_KEEP dumps
+        dumps = sorted(directory.glob('*.prof'), key=lambda path: path.stat().st_mtime, reverse=True)
+        for path in dumps[settings.PROFILING_CPROFILE_KEEP:]:
+            path.unlink(missing_ok=True)
+
+
+class MetricsMiddleware:
+    """
+    Feeds core.metrics: requests, latency and query counts per view, served at /metrics.
+    Streaming responses are measured until their body has been sent.
+
+    Only installed when METRICS_ENABLED is set.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        stack = ExitStack()
+        started = time.perf_counter()
+        try:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        except BaseException:
+            stack.close()
+            raise
+
+        def finish():
+            stack.close()
+            duration = time.perf_counter() - started
+            name = getattr(request, '_view_name', None) or 'unresolved'
+            metrics.inc('http_requests_total', view=name, status=response.status_code)
+            metrics.observe('http_request_duration_seconds', duration, view=name)
+            metrics.observe('db_queries_per_request', counter.count, view=name)
+
+        return when_sent(response, finish)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_name = view_name(view_func, request.method)
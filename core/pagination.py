@@ -0,0 +1,167 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CountedPageNumberPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination on a unique ordering, `(created_at, id)` by default.
+
+    Each page is a `WHERE (created_at, id) < (last seen)` lookup over an index,
+    so it costs the same on page 1 and page 10,000, and rows inserted while a
+    client is paging do not shift or repeat items. The cursor is an opaque
+    base64 token, as with DRF's CursorPagination.
+
+    `?page=N` switches to classic page numbers with a total `count`, for
+    clients that really need it. That costs a COUNT(*) and an OFFSET scan.
+    Views can set `keyset_ordering` to page on different fields, the last
+    one must be unique. Full-text results (see core.search) page in rank order.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.offset_paginator = None
+        if 'page' in request.query_params:
+            self.offset_paginator = CountedPageNumberPagination()
+            return self.offset_paginator.paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        if 'search_rank' in queryset.query.annotations:
+            self.ordering = ('search_rank', 'id')
+        else:
+            self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.base_url = request.build_absolute_uri()
+        position, reverse = self.decode_cursor(request)
+        if position is not None:
+            position = self._load(queryset, position)
+
+        ordering = [self._flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        if reverse:
+            page.reverse()
+
+        #Moving backwards we came from the next page, moving forwards from the previous one
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        self.page = page
+        return page
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_page_size(self, request):
+        page_size = settings.REST_FRAMEWORK.get('PAGE_SIZE') or 50
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse = data['p'], bool(data.get('r'))
+            if len(position) != len(self.ordering):
+                raise ValueError
+        except (TypeError, ValueError, KeyError, binascii.Error, UnicodeError):
+            raise self.invalid_cursor()
+        return position, reverse
+
+    def invalid_cursor(self):
+        return ValidationError({self.cursor_query_param: "Invalid cursor"})
+
+    def encode_cursor(self, obj, reverse):
+        position = [self._dump(getattr(obj, field.lstrip('-'))) for field in self.ordering]
+        data = {'p': position}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        url = remove_query_param(self.base_url, 'page')
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    #Rows strictly after `position` in `ordering`:
+    #(a > x) OR (a = x AND b > y) OR ..., with < for descending fields
+    def _after(self, ordering, position):
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    #Cursor values back to the types of their fields, so a tampered cursor is a 400 and not an error in the query
+    def _load(self, queryset, position):
+        values = []
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            try:
+                model_field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                model_field = queryset.query.annotations[name].output_field
+            try:
+                value = model_field.to_python(value)
+            except (TypeError, ValueError, DjangoValidationError):
+                raise self.invalid_cursor()
+            if value is None or isinstance(value, (list, dict)):
+                raise self.invalid_cursor()
+            values.append(value)
+        return values
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _dump(value):
+        #Full precision, DjangoJSONEncoder would cut microseconds off datetimes
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
@@ -0,0 +1,221 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import IntegerField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+#(database alias, table) pairs known to exist, the tables only come and go with migrations
+_known_indexes = set()
+
+#FTS5 indexes: the virtual table, the triggers keeping it in sync (name -> (table
+#it is on, SQL)) and how to refill it. The search index migrations build them
+#from here. SQLite drops a table's triggers when a migration rebuilds the table
+#(e.g. AddField), such migrations wrap the operation in drop_search_triggers()
+#and restore_search_triggers().
+SEARCH_INDEXES = {
+    #External content table over inventory_product
+    'inventory_product_fts': {
+        'table': """CREATE VIRTUAL TABLE inventory_product_fts USING fts5(
+            name, content='inventory_product', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        'triggers': {
+            'inventory_product_fts_insert': ('inventory_product', """CREATE TRIGGER inventory_product_fts_insert AFTER INSERT ON inventory_product BEGIN
+                INSERT INTO inventory_product_fts(rowid, name) VALUES (new.id, new.name);
+            END"""),
+            'inventory_product_fts_delete': ('inventory_product', """CREATE TRIGGER inventory_product_fts_delete AFTER DELETE ON inventory_product BEGIN
+                INSERT INTO inventory_product_fts(inventory_product_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            END"""),
+            'inventory_product_fts_update': ('inventory_product', """CREATE TRIGGER inventory_product_fts_update AFTER UPDATE OF name ON inventory_product BEGIN
+                INSERT INTO inventory_product_fts(inventory_product_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                INSERT INTO inventory_product_fts(rowid, name) VALUES (new.id, new.name);
+            END"""),
+        },
+        'rebuild': ["INSERT INTO inventory_product_fts(inventory_product_fts) VALUES ('rebuild')"],
+    },
+    #External content table over customers_customer
+    'customers_customer_fts': {
+        'table': """CREATE VIRTUAL TABLE customers_customer_fts USING fts5(
+            name, phone, email, content='customers_customer', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        'triggers': {
+            'customers_customer_fts_insert': ('customers_customer', """CREATE TRIGGER customers_customer_fts_insert AFTER INSERT ON customers_customer BEGIN
+                INSERT INTO customers_customer_fts(rowid, name, phone, email) VALUES (new.id, new.name, new.phone, new.email);
+            END"""),
+            'customers_customer_fts_delete': ('customers_customer', """CREATE TRIGGER customers_customer_fts_delete AFTER DELETE ON customers_customer BEGIN
+                INSERT INTO customers_customer_fts(customers_customer_fts, rowid, name, phone, email)
+                VALUES ('delete', old.id, old.name, old.phone, old.email);
+            END"""),
+            'customers_customer_fts_update': ('customers_customer', """CREATE TRIGGER customers_customer_fts_update AFTER UPDATE OF name, phone, email ON customers_customer BEGIN
+                INSERT INTO customers_customer_fts(customers_customer_fts, rowid, name, phone, email)
+                VALUES ('delete', old.id, old.name, old.phone, old.email);
+                INSERT INTO customers_customer_fts(rowid, name, phone, email) VALUES (new.id, new.name, new.phone, new.email);
+            END"""),
+        },
+        'rebuild': ["INSERT INTO customers_customer_fts(customers_customer_fts) VALUES ('rebuild')"],
+    },
+    #Orders are searched by invoice id and customer, so the table keeps its own
+    #copy of the customer fields, refreshed when an order or its customer changes
+    'sales_order_fts': {
+        'table': """CREATE VIRTUAL TABLE sales_order_fts USING fts5(
+            invoice_id, customer_name, customer_phone,
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        'triggers': {
+            'sales_order_fts_insert': ('sales_order', """CREATE TRIGGER sales_order_fts_insert AFTER INSERT ON sales_order BEGIN
+                INSERT INTO sales_order_fts(rowid, invoice_id, customer_name, customer_phone)
+                SELECT new.id, new.invoice_id, name, phone FROM customers_customer WHERE id = new.customer_id;
+            END"""),
+            'sales_order_fts_delete': ('sales_order', """CREATE TRIGGER sales_order_fts_delete AFTER DELETE ON sales_order BEGIN
+                DELETE FROM sales_order_fts WHERE rowid = old.id;
+            END"""),
+            'sales_order_fts_update': ('sales_order', """CREATE TRIGGER sales_order_fts_update AFTER UPDATE OF invoice_id, customer_id ON sales_order BEGIN
+                DELETE FROM sales_order_fts WHERE rowid = old.id;
+                INSERT INTO sales_order_fts(rowid, invoice_id, customer_name, customer_phone)
+                SELECT new.id, new.invoice_id, name, phone FROM customers_customer WHERE id = new.customer_id;
+            END"""),
+            'sales_order_fts_customer_update': ('customers_customer', """CREATE TRIGGER sales_order_fts_customer_update AFTER UPDATE OF name, phone ON customers_customer
+            WHEN old.name IS NOT new.name OR old.phone IS NOT new.phone BEGIN
+                UPDATE sales_order_fts SET customer_name = new.name, customer_phone = new.phone
+                WHERE rowid IN (SELECT id FROM sales_order WHERE customer_id = new.id);
+            END"""),
+        },
+        'rebuild': [
+            "DELETE FROM sales_order_fts",
+            """INSERT INTO sales_order_fts(rowid, invoice_id, customer_name, customer_phone)
+            SELECT o.id, o.invoice_id, c.name, c.phone FROM sales_order o JOIN customers_customer c ON c.id = o.customer_id""",
+        ],
+    },
+}
+
+
+#Other databases keep using SearchFilter, so these do nothing there
+def create_search_index(schema_editor, index):
+    """Create the FTS5 table `index` with its triggers and fill it, for a migration."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    spec = SEARCH_INDEXES[index]
+    schema_editor.execute(spec['table'])
+    for _, sql in spec['triggers'].values():
+        schema_editor.execute(sql)
+    for sql in spec['rebuild']:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(schema_editor, index):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in SEARCH_INDEXES[index]['triggers']:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {index}')
+
+
+def _triggers_using(table):
+    """(index, trigger name, SQL) of the search triggers on or reading `table`."""
+    return [
+        (index, name, sql)
+        for index, spec in SEARCH_INDEXES.items()
+        for name, (_, sql) in spec['triggers'].items()
+        if table in sql
+    ]
+
+
+def drop_search_triggers(schema_editor, table):
+    """
+    Drop the search triggers on or reading `table`, before a migration rebuilds it.
+
+    SQLite rebuilds a table for e.g. AddField by copying it and renaming the
+    copy, which drops the triggers on it and fails while triggers on other
+    tables refer to it. Run restore_search_triggers() after the operation.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for _, name, _ in _triggers_using(table):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def restore_search_triggers(schema_editor, table):
+    """Recreate the search triggers dropped by drop_search_triggers() and refill their indexes."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+    indexes = []
+    for index, name, sql in _triggers_using(table):
+        if index not in tables:
+            continue  #Its migration has not run yet and will create the triggers
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        schema_editor.execute(sql)
+        if index not in indexes:
+            indexes.append(index)
+    #Rows written while the triggers were gone are not indexed
+    for index in indexes:
+        for sql in SEARCH_INDEXES[index]['rebuild']:
+            schema_editor.execute(sql)
+
+
+def fts_available(alias, index):
+    """Whether the FTS5 table `index` exists on the `alias` database."""
+    if (alias, index) in _known_indexes:
+        return True
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        if index not in connection.introspection.table_names(cursor):
+            return False
+    _known_indexes.add((alias, index))
+    return True
+
+
+def fts_query(terms):
+    """FTS5 MATCH expression requiring every term, each as a prefix."""
+    #Quoted strings are taken literally by FTS5, so punctuation in a phone number is harmless
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    `?search=` answered from an SQLite FTS5 index, best matches first.
+
+    Views name the index in `search_index`; the tables and the triggers that
+    keep them in sync are created by migrations. Terms match as prefixes.
+    The MATCH runs once and its rows are read in rank order, a chunk at a
+    time, keeping those the view's filters let through until there are
+    SEARCH_MAX_RESULTS. They are returned annotated with their position as
+    `search_rank`. On other databases, or when the view
+    has no index, this is DRF's SearchFilter over `search_fields`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        index = getattr(view, 'search_index', None)
+        terms = [term for term in self.get_search_terms(request) if term.strip('"')]
+        if not terms or index is None or not fts_available(queryset.db, index):
+            return super().filter_queryset(request, queryset, view)
+
+        query = fts_query(terms)
+        limit = settings.SEARCH_MAX_RESULTS
+        ids = []
+        with connections[queryset.db].cursor() as cursor:
+            #One MATCH, read in rank order until enough matches pass the view's filters
+            cursor.execute(f'SELECT rowid FROM "{index}" WHERE "{index}" MATCH %s ORDER BY rank', [query])
+            while len(ids) < limit:
+                chunk = [row[0] for row in cursor.fetchmany(limit)]
+                if not chunk:
+                    break
+                kept = set(queryset.filter(pk__in=chunk).values_list('pk', flat=True))
+                ids += [pk for pk in chunk if pk in kept]
+        if not ids:
+            return queryset.none()
+        ids = ids[:limit]
+
+        #Position in the ranking, a simple CASE on the primary key
+        meta = queryset.model._meta
+        rank = RawSQL(
+            f'CASE "{meta.db_table}"."{meta.pk.column}" {" ".join(["WHEN %s THEN %s"] * len(ids))} END',
+            [value for position, pk in enumerate(ids) for value in (pk, position)],
+            output_field=IntegerField()
+        )
+        return queryset.filter(pk__in=ids).annotate(search_rank=rank).order_by('search_rank')
@@ -54,22 +54,41 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        # TokenAuthentication with an in-process cache of token -> user
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Cursor based paging on (created_at, id), ?page=N for numbered pages with a total count
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
+# Token lookups cached by accounts.authentication.CachedTokenAuthentication.
+# Entries are checked against a per-user version in CACHES on each request, so
+# changes reach every worker process when CACHES is shared between them
+# (e.g. Redis). Changes made without signals are missed for up to the TTL.
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 60
+
 AUTH_USER_MODEL = 'accounts.User'
 
 
+# Orders committed per transaction by the bulk upload endpoint (?chunk_size=).
+BULK_ORDER_CHUNK_SIZE = 100
+BULK_ORDER_MAX_CHUNK_SIZE = 1000
+
+
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',    # Removes itself unless METRICS_ENABLED
+    'core.middleware.ProfilingMiddleware',  # Removes itself unless PROFILING_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'inventory.middleware.AuditUserMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -101,9 +120,78 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # SQLite ignores SELECT ... FOR UPDATE, so take the write lock when a
+            # transaction starts instead of failing to upgrade a read lock later.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Local memory is per process. With several workers point this at a shared
+# backend (Redis, Memcached) so invalidation reaches every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'billing-system',
     }
 }
 
+# Keeps metrics, invoice PDFs and profiles written by tests out of var/
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# Seconds a cached dashboard response lives even if nothing invalidates it.
+DASHBOARD_CACHE_TIMEOUT = 60
+
+
+# Full-text search (core.search). On SQLite, ?search= reads FTS5 indexes kept
+# in sync by triggers; this caps how many ranked matches a search returns.
+SEARCH_MAX_RESULTS = 500
+
+
+# Rendered invoice PDFs, evicted least recently used first past the size limit.
+INVOICE_PDF_CACHE_DIR = BASE_DIR / 'var' / 'invoices'
+INVOICE_PDF_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Processes rendering PDFs for batch invoice downloads, one pool per web worker
+# process shared by its requests. None uses every core, 1 renders in the request.
+INVOICE_RENDER_WORKERS = 2
+# Orders one invoices-zip download may hold, larger selections get a 400.
+INVOICE_ZIP_MAX_ORDERS = 1000
+
+
+# Prometheus metrics served at /metrics (core.metrics). Every worker process
+# writes its counters to its own file in METRICS_DIR, the endpoint adds them up.
+# Files of exited processes are folded into archive.json, the directory only
+# holds one file per live process. Disabled, nothing is recorded.
+METRICS_ENABLED = True
+METRICS_DIR = BASE_DIR / 'var' / 'metrics'
+METRICS_FLUSH_INTERVAL = 5  # seconds between writes of a process's file
+
+
+# Request profiling (core.middleware.ProfilingMiddleware): Server-Timing
+# headers, query counts per view and N+1 warnings on the core.middleware logger.
+# A share of requests can run under cProfile, slow ones are dumped as .prof files.
+PROFILING_ENABLED = False
+PROFILING_SLOW_REQUEST_MS = 500
+PROFILING_DUPLICATE_QUERY_THRESHOLD = 5   # same statement this often in one request
+PROFILING_CPROFILE_SAMPLE_RATE = 0.0      # 0 to 1, share of requests profiled
+PROFILING_CPROFILE_DIR = BASE_DIR / 'var' / 'profiles'
+PROFILING_CPROFILE_KEEP = 100             # newest dumps kept
+
+
+# Audit log rows are queued in memory and written in batches by a background
+# thread. AUDIT_LOG_ASYNC = False writes them immediately (use it in tests).
+AUDIT_LOG_ASYNC = True
+AUDIT_LOG_BUFFER_SIZE = 10000      # rows held before callers write themselves
+AUDIT_LOG_FLUSH_SIZE = 500         # rows per INSERT
+AUDIT_LOG_FLUSH_INTERVAL = 1.0     # seconds
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -0,0 +1,59 @@
+import re
+import tempfile
+from pathlib import Path
+
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+#A table read row by row without an index, e.g. "SCAN sales_order"
+FULL_SCAN = re.compile(r'SCAN (?!CONSTANT ROW)\S+( AS \S+)?$')
+
+
+class QueryPlanAssertions:
+    """TestCase mixin checking SQLite's EXPLAIN QUERY PLAN for a queryset."""
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, queryset, index=None):
+        """Fail if any table in the plan is fully scanned, or if `index` is not used."""
+        plan = self.query_plan(queryset)
+        scans = [step for step in plan if FULL_SCAN.match(step)]
+        self.assertFalse(scans, f"Full table scan in query plan: {plan}")
+        if index is not None:
+            self.assertTrue(
+                any(re.search(rf'\bINDEX {re.escape(index)}\b', step) for step in plan),
+                f"{index} not used, query plan: {plan}"
+            )
+        return plan
+
+
+class TestRunner(DiscoverRunner):
+    """
+    The default runner, with metrics, cached invoice PDFs and profiles kept in a
+    temporary directory instead of var/, which is where the running server keeps them.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._directory = tempfile.TemporaryDirectory(prefix='billing-tests-')
+        root = Path(self._directory.name)
+        self._settings = override_settings(
+            METRICS_DIR=root / 'metrics',
+            INVOICE_PDF_CACHE_DIR=root / 'invoices',
+            PROFILING_CPROFILE_DIR=root / 'profiles',
+        )
+        self._settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        from .metrics import metrics
+
+        #Written now, the exit hook would flush to the real directory
+        metrics.flush()
+        self._settings.disable()
+        self._directory.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,179 @@
+import base64
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from customers.models import Customer
+from sales.models import Order
+from .metrics import ARCHIVE, Metrics, metrics as process_metrics
+from .middleware import view_stats
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(METRICS_DIR=self.directory, METRICS_ENABLED=True, METRICS_FLUSH_INTERVAL=3600)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        #The process-wide instance's flusher thread sees the overridden METRICS_DIR too
+        flush = mock.patch.object(process_metrics, 'flush')
+        flush.start()
+        self.addCleanup(flush.stop)
+
+    def write(self, name, value):
+        (self.directory / name).write_text(json.dumps({
+            'counters': [['orders_created_total', [], value]],
+            'histograms': [['db_queries_per_request', [['view', 'v']], [1, 0, 0, 0, 0, 0, 0, 0, 0], 0, 1]],
+        }))
+
+    def exited_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        return process.pid
+
+    def test_exited_processes_are_folded_into_the_archive(self):
+        pid = self.exited_pid()
+        self.write(f'{pid}-1.json', 3)
+        self.write(f'{pid}-2.json', 4)  #Same pid reused, and gone again
+        metrics = Metrics()
+        metrics.inc('orders_created_total')
+
+        counters, histograms = metrics.collect()
+        self.assertEqual(counters[('orders_created_total', ())], 8)
+        self.assertEqual(histograms[('db_queries_per_request', (('view', 'v'),))][2], 2)
+        self.assertEqual(
+            sorted(path.name for path in self.directory.glob('*.json')), sorted([ARCHIVE, metrics._path_name])
+        )
+
+        #Folding again must not count the archive twice
+        counters, _ = metrics.collect()
+        self.assertEqual(counters[('orders_created_total', ())], 8)
+
+    def test_older_file_of_a_live_pid_is_folded(self):
+        metrics = Metrics()
+        self.write(f'{metrics._pid}-1.json', 5)
+        metrics.inc('orders_created_total')
+
+        counters, _ = metrics.collect()
+        self.assertEqual(counters[('orders_created_total', ())], 6)
+        self.assertFalse((self.directory / f'{metrics._pid}-1.json').exists())
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_records_nothing(self):
+        metrics = Metrics()
+        metrics.inc('orders_created_total')
+        metrics.observe('export_size_bytes', 100, report='total_summary', format='csv')
+        metrics.flush()
+        self.assertEqual(metrics._counters, {})
+        self.assertEqual(metrics._histograms, {})
+        self.assertIsNone(metrics._flusher)
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x', role='manager'))
+        customer = Customer.objects.create(name='Acme Traders', phone='01711000000')
+        self.orders = [Order.objects.create(customer=customer) for _ in range(5)]
+        #Equal sort keys, only the id tells the rows apart
+        Order.objects.update(created_at=timezone.now())
+
+    def walk(self, **params):
+        ids = []
+        response = self.client.get('/sales/orders/', {'page_size': 2, **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [order['id'] for order in response.data['results']]
+            if not response.data['next']:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def cursor(self, data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+    def test_pages_over_equal_sort_keys(self):
+        ids, last = self.walk()
+        self.assertEqual(ids, sorted((order.pk for order in self.orders), reverse=True))
+
+        #And back again from the last page
+        back = []
+        response = last
+        while response.data['previous']:
+            response = self.client.get(response.data['previous'])
+            back = [order['id'] for order in response.data['results']] + back
+        self.assertEqual(back, ids[:len(back)])
+        self.assertEqual(len(back), 4)
+
+    @skipUnless(connection.vendor == 'sqlite', "Full-text search uses SQLite FTS5")
+    def test_pages_in_search_rank_order(self):
+        ids, _ = self.walk(search='acme')
+        self.assertEqual(sorted(ids), sorted(order.pk for order in self.orders))
+
+        response = self.client.get('/sales/orders/', {'search': 'acme', 'cursor': self.cursor({'p': ['first', 1]})})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tampered_cursor(self):
+        for cursor in (
+            'not base64!',
+            self.cursor([1, 2]),
+            self.cursor({'p': [1]}),
+            self.cursor({'p': ['yesterday', 1]}),
+            self.cursor({'p': [timezone.now().isoformat(), 'x']}),
+            self.cursor({'p': [timezone.now().isoformat(), [1]]}),
+            self.cursor({'p': [None, 1]}),
+        ):
+            response = self.client.get('/sales/orders/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertIn('cursor', response.data)
+
+
+@override_settings(PROFILING_ENABLED=True, METRICS_ENABLED=True, PROFILING_CPROFILE_SAMPLE_RATE=0.0)
+class MiddlewareTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x', role='manager'))
+        Order.objects.create(customer=Customer.objects.create(name='Acme', phone='01711000000'), payment_status='paid')
+        view_stats.clear()
+        self.addCleanup(view_stats.clear)
+
+    def test_request_is_timed_and_counted(self):
+        with mock.patch.object(process_metrics, 'observe') as observe:
+            response = self.client.get('/sales/orders/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        stats = view_stats.snapshot()['OrderViewSet.list']
+        self.assertEqual(stats['requests'], 1)
+        self.assertGreater(stats['queries'], 0)
+        observe.assert_any_call('db_queries_per_request', stats['queries'], view='OrderViewSet.list')
+
+    def test_streaming_response_is_measured_until_sent(self):
+        with mock.patch.object(process_metrics, 'observe') as observe:
+            response = self.client.get('/sales/orders/export/', {'report': 'total_summary', 'format': 'csv'})
+            #The export queries while it streams, nothing is recorded before the body is read
+            self.assertNotIn('OrderViewSet.export_orders', view_stats.snapshot())
+            b''.join(response.streaming_content)
+        stats = view_stats.snapshot()['OrderViewSet.export_orders']
+        self.assertGreater(stats['queries'], 0)
+        observe.assert_any_call('db_queries_per_request', stats['queries'], view='OrderViewSet.export_orders')
+        self.assertEqual(connection.execute_wrappers, [])
+
+    def test_streaming_response_closed_early(self):
+        response = self.client.get('/sales/orders/export/', {'report': 'total_summary', 'format': 'csv'})
+        response.close()
+        self.assertEqual(view_stats.snapshot()['OrderViewSet.export_orders']['requests'], 1)
+        self.assertEqual(connection.execute_wrappers, [])
+
+    @override_settings(PROFILING_DUPLICATE_QUERY_THRESHOLD=1)
+    def test_repeated_statements_are_logged(self):
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get('/sales/orders/')
+        self.assertIn('OrderViewSet.list', logs.output[0])
@@ -17,6 +17,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .views import MetricsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('djoser.urls')),
@@ -25,4 +27,5 @@ urlpatterns = [
     path('customers/', include('customers.urls')),
     path('inventory/', include('inventory.urls')),
     path('sales/', include('sales.urls')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
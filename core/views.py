@@ -0,0 +1,13 @@
+from django.http import HttpResponse
+from rest_framework.views import APIView
+
+from inventory.permissions import IsManager
+from .metrics import render_metrics
+
+
+class MetricsView(APIView):
+    """Prometheus scrape target, authenticate with a manager's token (`Authorization: Token <key>`)."""
+    permission_classes = [IsManager]
+
+    def get(self, request):
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['is_active', 'created_at', 'id'], name='customer_active_created_idx'),
+        ),
+    ]
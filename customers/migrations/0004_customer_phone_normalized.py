@@ -0,0 +1,57 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:01
+
+import unicodedata
+
+from django.db import migrations, models
+
+from core import search
+
+
+def backfill_phone_normalized(apps, schema_editor):
+    Customer = apps.get_model('customers', 'Customer')
+
+    #Same rule as Customer.normalize_phone, historical models do not carry methods
+    batch = []
+    for customer in Customer.objects.only('id', 'phone').iterator(chunk_size=2000):
+        customer.phone_normalized = ''.join(
+            str(unicodedata.digit(char)) for char in customer.phone or '' if char.isdigit()
+        )
+        batch.append(customer)
+        if len(batch) >= 2000:
+            Customer.objects.bulk_update(batch, ['phone_normalized'])
+            batch = []
+    if batch:
+        Customer.objects.bulk_update(batch, ['phone_normalized'])
+
+
+#SQLite rebuilds customers_customer for the AddField, the search triggers on it
+#and the order index triggers reading it are dropped around the rebuild
+def drop_search_triggers(apps, schema_editor):
+    search.drop_search_triggers(schema_editor, 'customers_customer')
+
+
+def restore_search_triggers(apps, schema_editor):
+    search.restore_search_triggers(schema_editor, 'customers_customer')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_customer_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_search_triggers, restore_search_triggers),
+        migrations.AddField(
+            model_name='customer',
+            name='phone_normalized',
+            field=models.CharField(default='', editable=False, max_length=15),
+        ),
+        migrations.RunPython(restore_search_triggers, drop_search_triggers),
+        #Filled before the index is built, so it is built once
+        migrations.RunPython(backfill_phone_normalized, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['phone_normalized'], name='customer_phone_idx'),
+        ),
+    ]
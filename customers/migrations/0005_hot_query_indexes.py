@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='customer_active_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at', 'id'], name='customer_active_created_idx'),
+        ),
+    ]
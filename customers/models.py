@@ -1,3 +1,5 @@
+import unicodedata
+
 from django.db import models
 
 # Create your models here.
@@ -5,10 +7,33 @@ from django.db import models
 class Customer(models.Model):
     name = models.CharField(max_length=100)
     phone = models.CharField(max_length=15)
+    phone_normalized = models.CharField(max_length=15, editable=False, default='')  #Digits of phone, for indexed lookups
     email = models.EmailField(blank=True)
     address = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            #Keyset pagination of active customers. Partial, because SQLite filters booleans
+            #as a bare `WHERE is_active`, which an equality index on is_active cannot serve
+            models.Index(
+                fields=['created_at', 'id'], condition=models.Q(is_active=True), name='customer_active_created_idx'
+            ),
+            models.Index(fields=['phone_normalized'], name='customer_phone_idx'),  #Exact and prefix phone lookup
+        ]
+
     def __str__(self):
         return self.name
+
+    @staticmethod
+    def normalize_phone(phone):
+        #ASCII digits only, so numbers typed with e.g. Bengali digits get the same key
+        return ''.join(str(unicodedata.digit(char)) for char in phone or '' if char.isdigit())
+
+    def save(self, *args, **kwargs):
+        self.phone_normalized = self.normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_normalized'}
+        super().save(*args, **kwargs)
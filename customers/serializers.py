@@ -6,7 +6,7 @@ class CustomerSerializer(serializers.ModelSerializer):
         model = Customer
         fields = ['id', 'name', 'phone', 'email', 'address', 'is_active', 'created_at']
 
-    def validated_phone(self, value):
+    def validate_phone(self, value):
         if not value.replace('+', '').replace('-', '').replace(' ', '').isdigit():
             raise serializers.ValidationError("Phone number must contain only digits, spaces, + or -")
         return value
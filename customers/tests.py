@@ -1,3 +1,92 @@
+from unittest import skipUnless
+
+from django.db import connection
 from django.test import TestCase
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from core.pagination import KeysetPagination
+from core.testing import QueryPlanAssertions
+from .models import Customer
+
+
+@skipUnless(connection.vendor == 'sqlite', "Query plans are checked on SQLite")
+class CustomerQueryPlanTests(QueryPlanAssertions, TestCase):
+    """The hot customer queries must stay index lookups."""
+
+    def setUp(self):
+        self.customers = Customer.objects.filter(is_active=True)
+
+    def test_list_page(self):
+        self.assertUsesIndex(
+            self.customers.order_by('-created_at', '-id')[:51], 'customer_active_created_idx'
+        )
+
+    def test_list_next_page(self):
+        ordering = ['-created_at', '-id']
+        after = KeysetPagination()._after(ordering, ['2026-01-01T00:00:00+00:00', 100])
+        self.assertUsesIndex(
+            self.customers.filter(after).order_by(*ordering)[:51], 'customer_active_created_idx'
+        )
+
+    def test_phone_lookup(self):
+        self.assertUsesIndex(
+            self.customers.filter(
+                phone_normalized__gte='01711', phone_normalized__lt='01711:'
+            ).order_by('phone_normalized', 'id')[:20],
+            'customer_phone_idx'
+        )
+
+
+class PhoneLookupTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('staff', password='x', role='staff'))
+        self.exact = Customer.objects.create(name='Rahim', phone='017-1100')
+        self.longer = Customer.objects.create(name='Karim', phone='01711 000 000')
+        self.other = Customer.objects.create(name='Fatima', phone='01811000000')
+        Customer.objects.create(name='Gone', phone='01711000001', is_active=False)
+
+    def lookup(self, phone):
+        return self.client.get('/customers/lookup/', {'phone': phone})
+
+    def test_exact_match_first_then_prefix(self):
+        response = self.lookup('0171-100')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['phone'], '0171100')
+        self.assertEqual(
+            [(customer['id'], customer['exact']) for customer in response.data['results']],
+            [(self.exact.pk, True), (self.longer.pk, False)]
+        )
+
+    def test_other_digits_are_normalized(self):
+        response = self.lookup('০১৮১১')  #Bengali digits
+        self.assertEqual([customer['id'] for customer in response.data['results']], [self.other.pk])
+
+    def test_too_short(self):
+        for phone in ('', '01', 'abc'):
+            self.assertEqual(self.lookup(phone).status_code, 400, phone)
+
+
+class DuplicatePhonesTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x', role='manager'))
+
+    def test_groups_customers_by_normalized_phone(self):
+        first = Customer.objects.create(name='Rahim', phone='01711-000000')
+        second = Customer.objects.create(name='Rahim A.', phone='01711 000 000')
+        third = Customer.objects.create(name='R. Ahmed', phone='01711000000')
+        Customer.objects.create(name='Fatima', phone='01811000000')
+        Customer.objects.create(name='Gone', phone='01811000000', is_active=False)
+        Customer.objects.create(name='No phone', phone='')
+        Customer.objects.create(name='No phone either', phone='-')
+
+        response = self.client.get('/customers/duplicate-phones/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        group = response.data[0]
+        self.assertEqual((group['phone_normalized'], group['count']), ('01711000000', 3))
+        self.assertEqual([customer['id'] for customer in group['customers']], [first.pk, second.pk, third.pk])
 
-# Create your tests here.
+    def test_manager_only(self):
+        self.client.force_authenticate(User.objects.create_user('staff', password='x', role='staff'))
+        self.assertEqual(self.client.get('/customers/duplicate-phones/').status_code, 403)
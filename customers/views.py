@@ -1,17 +1,21 @@
-from rest_framework import viewsets, filters
+from django.db.models import Count
+from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 from django_filters.rest_framework import DjangoFilterBackend
+from core.search import FullTextSearchFilter
 from .models import Customer
 from .serializers import CustomerListSerializer, CustomerSerializer
-from inventory.permissions import IsStaffOrManager
+from inventory.permissions import IsManager, IsStaffOrManager
 
 # Create your views here.
 class CustomerViewSet(viewsets.ModelViewSet):
     permission_classes = [IsStaffOrManager]
-    queryset = Customer.objects.filter(is_active=True).order_by('-created_at')
-    filter_backends = [filters.SearchFilter]
+    queryset = Customer.objects.filter(is_active=True).order_by('-created_at', '-id')
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['name', 'phone', 'email']
+    search_index = 'customers_customer_fts'
 
     def get_serializer_class(self):
         #For list of customers (light)
@@ -29,3 +33,47 @@ class CustomerViewSet(viewsets.ModelViewSet):
             status=status.HTTP_204_NO_CONTENT
         )
 
+    #Phone lookup at the counter: exact match first, then numbers starting with the digits typed
+    @action(detail=False, methods=['get'])
+    def lookup(self, request):
+        phone = Customer.normalize_phone(request.query_params.get('phone'))
+        if len(phone) < 3:
+            return Response(
+                {"error": "Enter at least 3 digits of the phone number"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        #A range on the index: every digit string starting with `phone` sorts
+        #between it and `phone + ':'` (':' comes right after '9'), the exact match first
+        customers = self.get_queryset().filter(
+            phone_normalized__gte=phone,
+            phone_normalized__lt=phone + ':'
+        ).order_by('phone_normalized', 'id')[:20]
+
+        return Response({
+            "phone": phone,
+            "results": [
+                dict(CustomerListSerializer(customer).data, exact=customer.phone_normalized == phone)
+                for customer in customers
+            ]
+        })
+
+    #Phone numbers shared by more than one customer, e.g. the same person entered twice
+    @action(detail=False, methods=['get'], permission_classes=[IsManager], url_path='duplicate-phones')
+    def duplicate_phones(self, request):
+        duplicates = list(
+            self.get_queryset().exclude(phone_normalized='').values('phone_normalized').annotate(
+                count=Count('id')
+            ).filter(count__gt=1).order_by('-count', 'phone_normalized').values_list('phone_normalized', 'count')[:500]
+        )
+
+        customers = {}
+        for customer in self.get_queryset().filter(
+            phone_normalized__in=[phone for phone, _ in duplicates]
+        ).order_by('id').values('id', 'name', 'phone', 'phone_normalized'):
+            customers.setdefault(customer.pop('phone_normalized'), []).append(customer)
+
+        return Response([
+            {"phone_normalized": phone, "count": count, "customers": customers.get(phone, [])}
+            for phone, count in duplicates
+        ])
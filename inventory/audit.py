@@ -0,0 +1,177 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+#None: write immediately, False: suppressed, list: deferred entries
+_mode = ContextVar('audit_mode', default=None)
+
+#Request being handled by this thread/task, set by AuditUserMiddleware
+_current_request = ContextVar('audit_request', default=None)
+
+
+def current_user():
+    """The authenticated user of the current request, if any."""
+    request = _current_request.get()
+    #DRF copies the user it authenticates onto the underlying HttpRequest
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    return None
+
+
+def write_audit_logs(entries):
+    """
+    Record AuditLog rows, unless auditing is suppressed or deferred.
+
+    Rows without `changed_by` are attributed to the current request's user.
+    They are handed to the writer once the surrounding transaction commits,
+    so rolled back changes leave no audit trail.
+    """
+    if not entries:
+        return
+    mode = _mode.get()
+    if mode is False:
+        return
+    if isinstance(mode, list):
+        mode.extend(entries)
+        return
+
+    user = current_user()
+    if user is not None:
+        for entry in entries:
+            if entry.changed_by_id is None:
+                entry.changed_by = user
+    transaction.on_commit(lambda: audit_buffer.put(entries))
+
+
+@contextmanager
+def suppress_audit():
+    """Write no audit rows inside the block, e.g. for imports or data fixes."""
+    token = _mode.set(False)
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+@contextmanager
+def defer_audit():
+    """Collect audit rows inside the block and write them in one INSERT at the end."""
+    entries = []
+    token = _mode.set(entries)
+    try:
+        yield entries
+    finally:
+        _mode.reset(token)
+    write_audit_logs(entries)
+
+
+class AuditLogBuffer:
+    """
+    Bounded in-process queue of AuditLog rows written by a background thread.
+
+    The thread writes with bulk_create once AUDIT_LOG_FLUSH_SIZE rows are
+    waiting or AUDIT_LOG_FLUSH_INTERVAL seconds have passed. When the queue
+    is full the caller writes its rows itself, so nothing is dropped. Rows
+    still queued at interpreter exit are flushed by an atexit hook. With
+    AUDIT_LOG_ASYNC = False rows are written immediately (used by tests).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+
+    def put(self, entries):
+        if not settings.AUDIT_LOG_ASYNC:
+            AuditLog.objects.bulk_create(entries)
+            return
+        self._ensure_worker()
+        for position, entry in enumerate(entries):
+            try:
+                self._queue.put_nowait(entry)
+            except queue.Full:
+                #The writer is behind, apply back pressure instead of losing rows
+                AuditLog.objects.bulk_create(entries[position:])
+                return
+
+    def flush(self):
+        """Block until every queued row has been written."""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def stop(self):
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._thread.join(timeout=settings.AUDIT_LOG_FLUSH_INTERVAL * 5)
+        #Whatever the thread did not get to is written from here
+        self._write(self._drain())
+
+    def _ensure_worker(self):
+        #Threads do not survive a fork, so each worker process starts its own
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue(maxsize=settings.AUDIT_LOG_BUFFER_SIZE)
+            self._stopping = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                batch = []
+                deadline = time.monotonic() + settings.AUDIT_LOG_FLUSH_INTERVAL
+                while len(batch) < settings.AUDIT_LOG_FLUSH_SIZE:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                self._write(batch)
+                for _ in batch:
+                    self._queue.task_done()
+        finally:
+            connection.close()
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+            self._queue.task_done()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            AuditLog.objects.bulk_create(batch)
+        except Exception:
+            logger.exception("Could not write %d audit log rows", len(batch))
+            connection.close()  #Start the next batch on a fresh connection
+
+
+audit_buffer = AuditLogBuffer()
+atexit.register(audit_buffer.stop)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.stock import fold_movements, verify_snapshots
+
+
+class Command(BaseCommand):
+    help = "Fold new stock movements into the per-product snapshots and verify them against Product.quantity"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', action='store_true', help="Check the snapshots without folding")
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            folded = fold_movements()
+            self.stdout.write(f"Folded {folded} movements")
+
+        mismatches = verify_snapshots()
+        for product_id, name, quantity, expected in mismatches:
+            self.stderr.write(f"Product {product_id} ({name}): quantity {quantity}, ledger says {expected}")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} products do not match the stock ledger")
+        self.stdout.write(self.style.SUCCESS("Stock ledger matches product quantities"))
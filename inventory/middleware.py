@@ -0,0 +1,15 @@
+from .audit import _current_request
+
+
+class AuditUserMiddleware:
+    """Makes the current request available to audit logging (see inventory.audit.current_user)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_request.reset(token)
@@ -0,0 +1,60 @@
+# Generated by Django 6.0.1 on 2026-10-18 05:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_stock_ledger(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    StockSnapshot = apps.get_model('inventory', 'StockSnapshot')
+
+    #Current quantities become the opening balance, so the ledger adds up from here on
+    quantities = dict(Product.objects.values_list('id', 'quantity'))
+    StockMovement.objects.bulk_create([
+        StockMovement(product_id=product_id, kind='adjustment', quantity=quantity, reference='Opening balance')
+        for product_id, quantity in quantities.items() if quantity
+    ], batch_size=2000)
+
+    last = StockMovement.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    StockSnapshot.objects.bulk_create([
+        StockSnapshot(product_id=product_id, quantity=quantity, last_movement_id=last)
+        for product_id, quantity in quantities.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_snapshot', serialize=False, to='inventory.product')),
+                ('quantity', models.IntegerField(default=0)),
+                ('last_movement_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sale', 'Sale'), ('cancellation', 'Cancellation'), ('restock', 'Restock'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('reference', models.CharField(blank=True, max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at', 'id'], name='movement_product_created_idx'), models.Index(fields=['created_at', 'id'], name='movement_created_id_idx')],
+            },
+        ),
+        migrations.RunPython(open_stock_ledger, migrations.RunPython.noop),
+    ]
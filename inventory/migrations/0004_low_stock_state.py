@@ -0,0 +1,52 @@
+# Generated by Django 6.0.1 on 2026-10-18 05:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def flag_low_stock(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    LowStockEvent = apps.get_model('inventory', 'LowStockEvent')
+
+    low = Product.objects.filter(quantity__lt=models.F('min_stock_level'))
+    low.update(is_low_stock=True)
+    #Start the feed with what is low right now, so a first poll from 0 sees the full picture
+    LowStockEvent.objects.bulk_create([
+        LowStockEvent(product_id=product_id, kind='low', quantity=quantity, min_stock_level=min_stock_level)
+        for product_id, quantity, min_stock_level in low.values_list('id', 'quantity', 'min_stock_level')
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_stock_movement_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LowStockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('low', 'Fell below minimum'), ('restocked', 'Back above minimum')], max_length=10)),
+                ('quantity', models.IntegerField()),
+                ('min_stock_level', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='is_low_stock',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_low_stock', True)), fields=['id'], name='product_low_stock_idx'),
+        ),
+        migrations.AddField(
+            model_name='lowstockevent',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='low_stock_events', to='inventory.product'),
+        ),
+        migrations.RunPython(flag_low_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:05
+
+from django.db import migrations
+
+from core import search
+
+
+#The table, triggers and refill SQL live in core.search.SEARCH_INDEXES
+def create_search_index(apps, schema_editor):
+    search.create_search_index(schema_editor, 'inventory_product_fts')
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_search_index(schema_editor, 'inventory_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_low_stock_state'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
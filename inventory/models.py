@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 class Product(models.Model):
@@ -8,16 +9,124 @@ class Product(models.Model):
     quantity = models.IntegerField(default=0)
     min_stock_level = models.IntegerField(default=10)
     is_active = models.BooleanField(default=True)
+    is_low_stock = models.BooleanField(default=False, editable=False)  #quantity < min_stock_level, kept in step on every stock write
     created_at = models.DateTimeField(auto_now_add=True)
 
+    #Changes to these fields are written to the audit log (is_low_stock to the low-stock feed)
+    TRACKED_FIELDS = ('purchase_price', 'selling_price', 'quantity', 'is_low_stock')
+
+    class Meta:
+        indexes = [
+            #Keyset pagination of active products (see customer_active_created_idx on why it is partial)
+            models.Index(
+                fields=['created_at', 'id'], condition=models.Q(is_active=True), name='product_active_created_idx'
+            ),
+            models.Index(
+                fields=['id'], condition=models.Q(is_active=True, is_low_stock=True), name='product_low_stock_idx'
+            ),  #Only low-stock products are in the index
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        #F() quantities are only known after the UPDATE, inventory.stock.refresh_low_stock settles those
+        if not hasattr(self.quantity, 'resolve_expression'):
+            self.is_low_stock = self.quantity < self.min_stock_level
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and {'quantity', 'min_stock_level'} & set(update_fields):
+                kwargs['update_fields'] = {*update_fields, 'is_low_stock'}
+        super().save(*args, **kwargs)
+        #The saved values are the baseline for the next save, also for products created in memory
+        self.snapshot_tracked_fields()
+
+    #Remember the values as loaded, so a save can be audited without reading the row again
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_tracked_fields()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.snapshot_tracked_fields()
+
+    def snapshot_tracked_fields(self):
+        loaded = self.__dict__
+        self._loaded_values = {
+            field: loaded[field] for field in self.TRACKED_FIELDS
+            #Deferred fields are not loaded, F() expressions are only known after a refresh
+            if field in loaded and not hasattr(loaded[field], 'resolve_expression')
+        }
+
 class AuditLog(models.Model):
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_index=False)  #Leads auditlog_product_created_idx
     action = models.CharField(max_length=255)
     changed_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True)
+    #Stamped when the entry is built, not when the buffered writer gets to insert it
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='auditlog_created_id_idx'),  #Keyset pagination
+            models.Index(fields=['product', 'created_at', 'id'], name='auditlog_product_created_idx'),  #?product= history
+        ]
+
+    def __str__(self):
+        return self.action
+
+class LowStockEvent(models.Model):
+    """A product crossing its min_stock_level, polled incrementally by id."""
+    KIND_CHOICES = (
+        ('low', 'Fell below minimum'),
+        ('restocked', 'Back above minimum'),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='low_stock_events')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    quantity = models.IntegerField()
+    min_stock_level = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.action
\ No newline at end of file
+        return f"{self.product_id} {self.kind} at {self.quantity}"
+
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger of stock changes. Product.quantity is the running total
+    of these rows and is updated in the same transaction (see inventory.stock).
+    """
+    KIND_CHOICES = (
+        ('sale', 'Sale'),
+        ('cancellation', 'Cancellation'),
+        ('restock', 'Restock'),
+        ('adjustment', 'Adjustment'),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='movements')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()  #Signed, negative when stock leaves
+    reference = models.CharField(max_length=50, blank=True)  #e.g. the invoice id of the order
+    created_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at', 'id'], name='movement_product_created_idx'),  #Point-in-time stock
+            models.Index(fields=['created_at', 'id'], name='movement_created_id_idx'),  #Keyset pagination
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} of {self.product_id}"
+
+
+class StockSnapshot(models.Model):
+    """Stock of a product with every movement up to `last_movement_id` folded in."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='stock_snapshot')
+    quantity = models.IntegerField(default=0)
+    last_movement_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity} at movement {self.last_movement_id}"
@@ -1,8 +1,7 @@
 from rest_framework import serializers
-from .models import Product, AuditLog
+from .models import Product, AuditLog, LowStockEvent, StockMovement
 
 class ProductSerializer(serializers.ModelSerializer):
-    is_low_stock = serializers.SerializerMethodField()
     profit_margin = serializers.SerializerMethodField()
 
     class Meta:
@@ -13,25 +12,24 @@ class ProductSerializer(serializers.ModelSerializer):
 
         read_only_fields = ['id', 'created_at']
     
-    def get_is_low_stock(self, obj):
-        return obj.quantity < obj.min_stock_level
-    
     def get_profit_margin(self, obj):
         request = self.context.get('request')
         if request and hasattr(request.user, 'role') and request.user.role == 'manager':
             return float(obj.selling_price - obj.purchase_price)
         return None
 
+    def update(self, instance, validated_data):
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        #Write only the fields in the request, a full save would put back a quantity that a sale has since moved
+        instance.save(update_fields=list(validated_data))
+        return instance
+
 
 class ProductListSerializer(serializers.ModelSerializer):
-    is_low_stock = serializers.SerializerMethodField()
-    
     class Meta:
         model = Product
         fields = ['id', 'name', 'selling_price', 'quantity', 'is_low_stock', 'is_active']
-    
-    def get_is_low_stock(self, obj):
-        return obj.quantity < obj.min_stock_level
 
 
 class AuditLogSerializer(serializers.ModelSerializer):
@@ -41,4 +39,24 @@ class AuditLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = AuditLog
         fields = ['id', 'product', 'product_name', 'action', 'changed_by', 'changed_by_username', 'created_at']
-        read_only_fields = ['id', 'created_at']
\ No newline at end of file
+        read_only_fields = ['id', 'created_at']
+
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    created_by_username = serializers.CharField(source='created_by.username', read_only=True)
+
+    class Meta:
+        model = StockMovement
+        fields = ['id', 'product', 'product_name', 'kind', 'quantity', 'reference',
+                  'created_by', 'created_by_username', 'created_at']
+        read_only_fields = fields
+
+
+class LowStockEventSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = LowStockEvent
+        fields = ['id', 'product', 'product_name', 'kind', 'quantity', 'min_stock_level', 'created_at']
+        read_only_fields = fields
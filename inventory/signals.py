@@ -1,62 +1,71 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save
 from django.dispatch import receiver
-from .models import Product, AuditLog
+from .models import Product, AuditLog, LowStockEvent, StockMovement
+from .audit import current_user, write_audit_logs
 
-# Store old values before save
-_product_old_values = {}
 
+# Old values come from Product._loaded_values, captured when the product was
+# loaded or last saved (see Product.from_db and Product.save), so there is no
+# extra query before each save.
+@receiver(post_save, sender=Product)
+def log_product_changes(sender, instance, created, update_fields=None, **kwargs):
+    entries = []
+    old_values = getattr(instance, '_loaded_values', {})
+    fields = update_fields if update_fields is not None else Product.TRACKED_FIELDS
 
-# This will run before Product is saved
-# We save old values of the product here to compare later.
-@receiver(pre_save, sender=Product)
-def track_product_changes(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            old_product = Product.objects.get(pk=instance.pk)
-            _product_old_values[instance.pk] = {
-                'purchase_price': old_product.purchase_price,
-                'selling_price': old_product.selling_price,
-                'quantity': old_product.quantity,
-            }
-        except Product.DoesNotExist:
-            pass
-
+    def changed(field):
+        return field in fields and field in old_values and old_values[field] != getattr(instance, field)
 
-@receiver(post_save, sender=Product)
-def log_product_changes(sender, instance, created, **kwargs):
     if created:
-        AuditLog.objects.create(
+        entries.append(AuditLog(
             product=instance,
             action=f"Product created with quantity {instance.quantity}",
             changed_by=None #We'll handle this in views
-        )
+        ))
+        if instance.quantity:
+            StockMovement.objects.create(
+                product=instance, kind='restock', quantity=instance.quantity,
+                reference='Initial stock', created_by=current_user()
+            )
     # If not created then it will change. so if it changes is the else statement
     else:
-        old_values = _product_old_values.get(instance.pk, {})
-
-        if old_values.get('purchase_price') != instance.purchase_price:
-            AuditLog.objects.create(
+        if changed('purchase_price'):
+            entries.append(AuditLog(
                 product=instance,
-                action=f"Purchase price changed from ${old_values["purchase_price"]} to ${instance.purchase_price}",
+                action=f"Purchase price changed from ${old_values['purchase_price']} to ${instance.purchase_price}",
                 changed_by=None
-            )
+            ))
 
-        if old_values.get('selling_price') != instance.selling_price:
-            AuditLog.objects.create(
+        if changed('selling_price'):
+            entries.append(AuditLog(
                 product=instance,
                 action=f"Selling price changed from ${old_values['selling_price']} to ${instance.selling_price}",
                 changed_by=None
-            )
-        
-        if old_values.get('quantity') != instance.quantity:
+            ))
+
+        if changed('quantity') and not hasattr(instance.quantity, 'resolve_expression'):
             diff = instance.quantity - old_values['quantity']
             action = f"Stock {'increased' if diff > 0 else 'decreased'} by {abs(diff)} (from {old_values['quantity']} to {instance.quantity})"
-            AuditLog.objects.create(
+            entries.append(AuditLog(
                 product=instance,
                 action=action,
                 changed_by=None
+            ))
+            #Edits through the product form keep the ledger in step with the quantity column
+            StockMovement.objects.create(
+                product=instance, kind='restock' if diff > 0 else 'adjustment', quantity=diff,
+                reference='Product update', created_by=current_user()
             )
-        
-        # Clean up stored old values
-        if instance.pk in _product_old_values:
-            del _product_old_values[instance.pk]
\ No newline at end of file
+
+    # All changes of one save in a single INSERT
+    write_audit_logs(entries)
+
+    # Product.save() keeps is_low_stock current, here we only note a crossing in the feed
+    if hasattr(instance.quantity, 'resolve_expression'):
+        from .stock import refresh_low_stock
+        refresh_low_stock([instance.pk])
+    elif instance.is_low_stock if created else changed('is_low_stock'):
+        LowStockEvent.objects.create(
+            product=instance, kind='low' if instance.is_low_stock else 'restocked',
+            quantity=instance.quantity, min_stock_level=instance.min_stock_level
+        )
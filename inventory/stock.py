@@ -0,0 +1,140 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import LowStockEvent, Product, StockMovement, StockSnapshot
+
+
+def move_stock(movements, check_available=False):
+    """
+    Append StockMovement rows to the ledger and apply them to Product.quantity.
+    Must run inside transaction.atomic().
+
+    Movements are summed per product and applied with one conditional UPDATE,
+    so concurrent writers never read-modify-write the quantity in Python.
+    With `check_available`, a product that would drop below zero is left
+    untouched and False is returned, the caller should roll back.
+    """
+    totals = {}
+    for movement in movements:
+        totals[movement.product_id] = totals.get(movement.product_id, 0) + movement.quantity
+    totals = {product_id: quantity for product_id, quantity in totals.items() if quantity}
+
+    if totals:
+        matching = Q()
+        for product_id, quantity in totals.items():
+            if check_available and quantity < 0:
+                matching |= Q(pk=product_id, quantity__gte=-quantity)
+            else:
+                matching |= Q(pk=product_id)
+        updated = Product.objects.filter(matching).update(
+            quantity=F('quantity') + Case(
+                *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in totals.items()],
+                output_field=IntegerField()
+            )
+        )
+        if updated != len(totals):
+            return False
+        refresh_low_stock(list(totals))
+
+    StockMovement.objects.bulk_create(movements)
+    return True
+
+
+def refresh_low_stock(product_ids):
+    """
+    Update is_low_stock after quantities changed through UPDATE rather than
+    Product.save(), and record a LowStockEvent for every product that crossed
+    its min_stock_level. Only the crossed products are read back.
+    """
+    crossed = Product.objects.filter(pk__in=product_ids).filter(
+        Q(is_low_stock=False, quantity__lt=F('min_stock_level')) |
+        Q(is_low_stock=True, quantity__gte=F('min_stock_level'))
+    ).values_list('pk', 'quantity', 'min_stock_level', 'is_low_stock')
+
+    events = []
+    flipped = {True: [], False: []}
+    for product_id, quantity, min_stock_level, was_low in crossed:
+        flipped[not was_low].append(product_id)
+        events.append(LowStockEvent(
+            product_id=product_id, kind='restocked' if was_low else 'low',
+            quantity=quantity, min_stock_level=min_stock_level
+        ))
+
+    for is_low_stock, ids in flipped.items():
+        if ids:
+            Product.objects.filter(pk__in=ids).update(is_low_stock=is_low_stock)
+    LowStockEvent.objects.bulk_create(events)
+    return events
+
+
+def stock_at(product_id, when):
+    """Stock of a product at a point in time, from its snapshot and the movements around it."""
+    snapshot = StockSnapshot.objects.filter(product_id=product_id).values_list(
+        'quantity', 'last_movement_id'
+    ).first()
+    quantity, last_movement_id = snapshot or (0, 0)
+
+    #Add what was folded in later than the snapshot, take back what happened after `when`
+    delta = StockMovement.objects.filter(product_id=product_id).filter(
+        Q(id__gt=last_movement_id, created_at__lte=when) |
+        Q(id__lte=last_movement_id, created_at__gt=when)
+    ).aggregate(
+        delta=Sum(Case(
+            When(id__gt=last_movement_id, then=F('quantity')),
+            default=-F('quantity')
+        ))
+    )['delta']
+    return quantity + (delta or 0)
+
+
+def fold_movements():
+    """
+    Fold the movements recorded since the last run into StockSnapshot rows.
+
+    Returns the number of movements folded. SQLite serializes writers, so no
+    movement can commit later with an id below the one folded up to here.
+    """
+    with transaction.atomic():
+        last = StockMovement.objects.aggregate(last=Max('id'))['last']
+        if last is None:
+            return 0
+
+        #Products created since the last fold start from an empty snapshot
+        missing = Product.objects.filter(stock_snapshot__isnull=True).values_list('pk', flat=True)
+        StockSnapshot.objects.bulk_create(
+            [StockSnapshot(product_id=product_id) for product_id in missing],
+            ignore_conflicts=True
+        )
+
+        folded = StockMovement.objects.filter(
+            id__gt=F('product__stock_snapshot__last_movement_id'), id__lte=last
+        ).count()
+
+        pending = StockMovement.objects.filter(
+            product=OuterRef('product'), id__gt=OuterRef('last_movement_id'), id__lte=last
+        ).values('product').annotate(total=Sum('quantity')).values('total')
+        StockSnapshot.objects.filter(last_movement_id__lt=last).update(
+            quantity=F('quantity') + Coalesce(Subquery(pending), 0),
+            last_movement_id=last,
+            updated_at=timezone.now()
+        )
+    return folded
+
+
+def verify_snapshots():
+    """
+    Products whose quantity differs from their snapshot plus the movements
+    after it, as (id, name, quantity, expected) tuples.
+    """
+    with transaction.atomic():
+        pending = StockMovement.objects.filter(
+            product=OuterRef('pk'),
+            id__gt=Coalesce(OuterRef('stock_snapshot__last_movement_id'), 0)
+        ).values('product').annotate(total=Sum('quantity')).values('total')
+        return list(
+            Product.objects.annotate(
+                expected=Coalesce('stock_snapshot__quantity', 0) + Coalesce(Subquery(pending), 0)
+            ).exclude(quantity=F('expected')).order_by('pk').values_list('pk', 'name', 'quantity', 'expected')
+        )
@@ -1,3 +1,251 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from core.testing import QueryPlanAssertions
+from .audit import AuditLogBuffer, suppress_audit, write_audit_logs
+from .models import AuditLog, LowStockEvent, Product, StockMovement, StockSnapshot
+from .serializers import ProductSerializer
+from .stock import fold_movements, move_stock, stock_at, verify_snapshots
+
+
+@skipUnless(connection.vendor == 'sqlite', "Query plans are checked on SQLite")
+class InventoryQueryPlanTests(QueryPlanAssertions, TestCase):
+    """The hot product, audit and stock queries must stay index lookups."""
+
+    def test_product_list_page(self):
+        self.assertUsesIndex(
+            Product.objects.filter(is_active=True).order_by('-created_at', '-id')[:51],
+            'product_active_created_idx'
+        )
+
+    def test_low_stock(self):
+        self.assertUsesIndex(
+            Product.objects.filter(is_active=True, is_low_stock=True).order_by('id').values('id', 'name', 'quantity'),
+            'product_low_stock_idx'
+        )
+
+    def test_low_stock_feed(self):
+        self.assertUsesIndex(LowStockEvent.objects.filter(id__gt=100).order_by('id')[:500])
+
+    def test_audit_log_for_product(self):
+        self.assertUsesIndex(
+            AuditLog.objects.filter(product=1).order_by('-created_at', '-id')[:51],
+            'auditlog_product_created_idx'
+        )
+
+    def test_stock_movements_for_product(self):
+        self.assertUsesIndex(
+            StockMovement.objects.filter(product=1, created_at__gt=timezone.now()),
+            'movement_product_created_idx'
+        )
+
+
+class LowStockFeedTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('staff', password='x', role='staff'))
+        for i in range(3):
+            Product.objects.create(name=f'Pen {i}', purchase_price=5, selling_price=10, quantity=1, min_stock_level=5)
+
+    def feed(self, **params):
+        return self.client.get('/inventory/products/low-stock-feed/', params)
+
+    def test_pages_through_events(self):
+        first = self.feed(limit=2).data
+        self.assertEqual(len(first['results']), 2)
+        self.assertTrue(first['has_more'])
+        second = self.feed(since=first['cursor'], limit=2).data
+        self.assertEqual(len(second['results']), 1)
+        self.assertFalse(second['has_more'])
+
+    def test_limit_is_clamped(self):
+        for limit in (0, -1):
+            response = self.feed(limit=limit)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), 1)
+
+    def test_non_integer_limit(self):
+        self.assertEqual(self.feed(limit='ten').status_code, 400)
+
+
+class StockAtTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x', role='manager'))
+        self.product = Product.objects.create(name='Pen', purchase_price=5, selling_price=10, quantity=7, min_stock_level=2)
+
+    def stock_at(self, at):
+        return self.client.get(f'/inventory/products/{self.product.pk}/stock-at/', {'at': at})
+
+    def test_current_stock(self):
+        response = self.stock_at(timezone.now().isoformat())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['quantity'], 7)
+
+    def test_invalid_dates(self):
+        for at in ('yesterday', '2026-02-30T00:00'):
+            self.assertEqual(self.stock_at(at).status_code, 400, at)
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Pen', purchase_price=5, selling_price=10, quantity=7, min_stock_level=2)
+        self.start = timezone.now() - timedelta(hours=10)
+
+    #Movements an hour apart, so stock_at() has distinct points in time to answer for
+    def move(self, *quantities):
+        with transaction.atomic():
+            move_stock([StockMovement(product=self.product, kind='adjustment', quantity=q) for q in quantities])
+        for hour, movement in enumerate(StockMovement.objects.order_by('id')):
+            StockMovement.objects.filter(pk=movement.pk).update(created_at=self.start + timedelta(hours=hour))
+
+    def history(self):
+        return [stock_at(self.product.pk, self.start + timedelta(hours=hour, minutes=30)) for hour in range(6)]
+
+    def quantity(self):
+        return Product.objects.get(pk=self.product.pk).quantity
+
+    def test_folding_keeps_the_answers(self):
+        self.move(-2, 3, -4)
+        before = self.history()
+        self.assertEqual(before[:4], [7, 5, 8, 4])
+
+        self.assertEqual(fold_movements(), 4)
+        self.assertEqual(self.history(), before)
+        self.assertEqual(StockSnapshot.objects.get(product=self.product).quantity, self.quantity())
+        self.assertEqual(fold_movements(), 0)
+
+        #Movements after the fold are added on top of the snapshot
+        self.move(-1)
+        self.assertEqual(self.history(), before[:4] + [3, 3])
+        self.assertEqual(stock_at(self.product.pk, timezone.now()), self.quantity())
+        self.assertEqual(verify_snapshots(), [])
+
+    def test_verify_only_detects_a_tampered_snapshot(self):
+        self.move(-2)
+        fold_movements()
+        self.move(1)
+        out, err = StringIO(), StringIO()
+        call_command('fold_stock_movements', '--verify-only', stdout=out, stderr=err)
+        self.assertIn('matches', out.getvalue())
+        self.assertEqual(StockSnapshot.objects.get(product=self.product).quantity, 5)  #Nothing was folded
+
+        StockSnapshot.objects.update(quantity=F('quantity') + 1)
+        with self.assertRaises(CommandError):
+            call_command('fold_stock_movements', '--verify-only', stdout=out, stderr=err)
+        self.assertIn('quantity 6, ledger says 7', err.getvalue())
+
+    def test_price_update_keeps_a_moved_quantity(self):
+        product = Product.objects.get(pk=self.product.pk)
+        self.move(-3)  #A sale after the product was loaded
+
+        serializer = ProductSerializer(product, data={'selling_price': '12.00'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.selling_price, product.quantity), (12, 4))
+        self.assertEqual(verify_snapshots(), [])
+
+
+@override_settings(AUDIT_LOG_ASYNC=False)
+class AuditLogTests(APITestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='x', role='manager')
+        self.client.force_authenticate(self.manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(name='Pen', purchase_price=5, selling_price=10, quantity=7, min_stock_level=2)
+
+    def actions(self):
+        return list(AuditLog.objects.filter(product=self.product).order_by('id').values_list('action', 'changed_by'))
+
+    def test_edits_are_logged_for_the_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/inventory/products/{self.product.pk}/', {'selling_price': '12.00', 'quantity': 9}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.actions(), [
+            ("Product created with quantity 7", None),
+            ("Selling price changed from $10.00 to $12.00", self.manager.pk),
+            ("Stock increased by 2 (from 7 to 9)", self.manager.pk),
+        ])
+
+    def test_second_save_of_a_product_created_in_memory(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product(name='Ink', purchase_price=2, selling_price=3, quantity=4, min_stock_level=1)
+            product.save()
+            product.quantity = 1
+            product.save()
+            product.selling_price = 5
+            product.save(update_fields=['selling_price'])
+        self.assertEqual(list(AuditLog.objects.filter(product=product).order_by('id').values_list('action', flat=True)), [
+            "Product created with quantity 4",
+            "Stock decreased by 3 (from 4 to 1)",
+            "Selling price changed from $3 to $5",
+        ])
+        self.assertEqual(list(StockMovement.objects.filter(product=product).order_by('id').values_list('quantity', flat=True)), [4, -3])
+
+    def test_suppressed(self):
+        with self.captureOnCommitCallbacks(execute=True), suppress_audit():
+            self.product.selling_price = 11
+            self.product.save()
+            write_audit_logs([AuditLog(product=self.product, action="Manual entry")])
+        self.assertEqual(self.actions(), [("Product created with quantity 7", None)])
+
+    def test_rolled_back_changes_are_not_logged(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            write_audit_logs([AuditLog(product=self.product, action="Manual entry")])
+        self.assertEqual(len(callbacks), 1)  #Only written once the transaction commits
+        self.assertEqual(len(self.actions()), 1)
+
+
+#The writer thread uses its own connection, the rows must be committed for it to see the product
+@override_settings(AUDIT_LOG_ASYNC=True, AUDIT_LOG_FLUSH_INTERVAL=0.05)
+class AuditLogBufferTests(TransactionTestCase):
+    def setUp(self):
+        with suppress_audit():
+            self.product = Product.objects.create(name='Pen', purchase_price=5, selling_price=10, quantity=0)
+        self.buffer = AuditLogBuffer()
+        self.addCleanup(self.buffer.stop)
+
+    def entries(self, count):
+        return [AuditLog(product=self.product, action=f"Entry {i}") for i in range(count)]
+
+    def test_flush_writes_queued_rows(self):
+        self.buffer.put(self.entries(3))
+        self.buffer.flush()
+        self.assertEqual(AuditLog.objects.filter(product=self.product).count(), 3)
+
+    def test_rows_keep_the_time_of_the_change(self):
+        entries = self.entries(2)
+        stamped = [entry.created_at for entry in entries]
+        with mock.patch('django.utils.timezone.now', return_value=stamped[0] + timedelta(minutes=5)):
+            self.buffer.put(entries)
+            self.buffer.flush()
+        self.assertEqual(list(AuditLog.objects.filter(product=self.product).order_by('id').values_list('created_at', flat=True)), stamped)
+
+    @override_settings(AUDIT_LOG_BUFFER_SIZE=2)
+    def test_full_buffer_writes_in_the_caller(self):
+        self.buffer.put(self.entries(5))
+        self.buffer.flush()
+        self.assertEqual(AuditLog.objects.filter(product=self.product).count(), 5)
+
+    def test_stop_drains_what_the_writer_left(self):
+        #What the atexit hook does: rows queued after the writer stopped are written by stop()
+        self.buffer.put(self.entries(1))
+        self.buffer.flush()
+        self.buffer._stopping.set()
+        self.buffer._thread.join()
+        for entry in self.entries(2):
+            self.buffer._queue.put_nowait(entry)
+
+        self.buffer.stop()
+        self.assertEqual(AuditLog.objects.filter(product=self.product).count(), 3)
+        self.assertEqual(self.buffer._queue.qsize(), 0)
@@ -5,6 +5,7 @@ from . import views
 router = DefaultRouter()
 router.register(r'products', views.ProductViewSet)
 router.register(r'audit-logs', views.AuditLogViewSet)
+router.register(r'stock-movements', views.StockMovementViewSet)
 
 urlpatterns = [
     path('', include(router.urls))
@@ -2,17 +2,24 @@ from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import F
-from .models import Product, AuditLog
-from .serializers import ProductSerializer, ProductListSerializer, AuditLogSerializer
+from core.search import FullTextSearchFilter
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .audit import write_audit_logs
+from .models import Product, AuditLog, LowStockEvent, StockMovement
+from .serializers import (
+    ProductSerializer, ProductListSerializer, AuditLogSerializer, LowStockEventSerializer, StockMovementSerializer
+)
+from .stock import stock_at
 from .permissions import IsStaffOrManager, IsManager, ManagerCanEditDeleteOnly 
 
 # Create your views here.
 class ProductViewSet(viewsets.ModelViewSet):
     permission_classes = [ManagerCanEditDeleteOnly]
-    queryset = Product.objects.order_by('-created_at')
-    filter_backends = [filters.SearchFilter]
+    queryset = Product.objects.order_by('-created_at', '-id')
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['name']
+    search_index = 'inventory_product_fts'
 
     def get_serializer_class(self):
         if self.request.user.role == 'staff':
@@ -35,9 +42,6 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
-    def perform_update(self, serializer):
-        serializer.save()
-
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         instance.is_active = False
@@ -47,19 +51,8 @@ class ProductViewSet(viewsets.ModelViewSet):
             status=status.HTTP_204_NO_CONTENT
         )
     
-    def perform_create(self, serializer):
-        instance = serializer.save()
-        AuditLog.objects.filter(
-            product=instance,
-            changed_by=None
-        ).update(changed_by=self.request.user)
-
-    def perform_update(self, serializer):
-        instance = serializer.save()
-        AuditLog.objects.filter(
-            product=instance,
-            changed_by=None
-        ).update(changed_by=self.request.user)
+    # Audit rows written by the product signals are attributed to
+    # request.user by inventory.audit, no follow-up UPDATE needed.
 
     #Get all the deleted products list
     @action(detail=False, methods=['get'], permission_classes=[IsManager], url_path='deleted')
@@ -81,33 +74,85 @@ class ProductViewSet(viewsets.ModelViewSet):
         product.is_active = True
         product.save()
 
-        AuditLog.objects.create(
+        write_audit_logs([AuditLog(
             product=product,
             action="Product restored from deleted state",
             changed_by=request.user
-        )
+        )])
         return Response(
             {"message": f"Product {product.name} restored successfully"},
             status=status.HTTP_200_OK
         )
 
-    
-    
+
+    #Stock of a product at a point in time, from the movement ledger
+    @action(detail=True, methods=['get'], permission_classes=[IsManager], url_path='stock-at', url_name='stock-at')
+    def stock_at_time(self, request, pk=None):
+        product = self.get_object()
+        at = request.query_params.get('at')
+        try:
+            when = parse_datetime(at) if at else timezone.now()
+        except ValueError:  #Well formed but impossible, e.g. February 30th
+            when = None
+        if when is None:
+            return Response(
+                {"error": "Invalid 'at'. Use an ISO 8601 date and time."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(when):
+            when = timezone.make_aware(when)
+
+        return Response({
+            "product": product.id,
+            "at": when,
+            "quantity": stock_at(product.id, when)
+        })
+
     @action(detail=False, methods=['get'], permission_classes=[IsStaffOrManager])
     def low_stock(self, request):
-        low_stock_products = Product.objects.filter(
-            is_active=True,
-            quantity__lt=F('min_stock_level')
-        )
+        #Served from the partial index on is_low_stock, ordering by its column makes it the planner's pick
+        low_stock_products = Product.objects.filter(is_active=True, is_low_stock=True).order_by('id')
         serializer = self.get_serializer(low_stock_products, many=True)
         return Response(serializer.data)
 
+    #Products that crossed their minimum stock level since the `since` cursor
+    @action(detail=False, methods=['get'], permission_classes=[IsStaffOrManager], url_path='low-stock-feed')
+    def low_stock_feed(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = max(1, min(int(request.query_params.get('limit', 500)), 1000))
+        except ValueError:
+            return Response(
+                {"error": "'since' and 'limit' must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        #One extra row tells whether another page follows
+        events = list(
+            LowStockEvent.objects.filter(id__gt=since).select_related('product').order_by('id')[:limit + 1]
+        )
+        has_more = len(events) > limit
+        events = events[:limit]
+        return Response({
+            #Pass this back as `since` on the next poll
+            "cursor": events[-1].id if events else since,
+            "has_more": has_more,
+            "results": LowStockEventSerializer(events, many=True).data
+        })
+
 
 class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsManager]
-    queryset = AuditLog.objects.all().order_by('-created_at')
+    queryset = AuditLog.objects.select_related('product', 'changed_by').order_by('-created_at', '-id')
     serializer_class = AuditLogSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['product']
     search_fields = ['action', 'product__name']
 
+
+class StockMovementViewSet(viewsets.ReadOnlyModelViewSet):
+    permission_classes = [IsManager]
+    queryset = StockMovement.objects.select_related('product', 'created_by').order_by('-created_at', '-id')
+    serializer_class = StockMovementSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['product', 'kind', 'reference']
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'dashboard:version'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+#Every write that can change the dashboard bumps this number, which orphans
+#all cached responses at once. Old entries simply expire through their TTL.
+def dashboard_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        #Start from the clock so a lost version key never brings back old entries
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_dashboard_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+#Bump once the current transaction commits, so a request racing the write
+#cannot cache the old numbers under the new version.
+def invalidate_dashboard():
+    transaction.on_commit(bump_dashboard_version)
+
+
+def get_dashboard(role, today, start, end):
+    data = cache.get(_key(role, today, start, end))
+    with _stats_lock:
+        _stats['hits' if data is not None else 'misses'] += 1
+    return data
+
+
+def set_dashboard(role, today, start, end, data):
+    cache.set(_key(role, today, start, end), data, settings.DASHBOARD_CACHE_TIMEOUT)
+
+
+def dashboard_cache_stats():
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+def _key(role, today, start, end):
+    return f'dashboard:{dashboard_version()}:{role}:{today}:{start}:{end}'
@@ -0,0 +1,58 @@
+import csv
+from decimal import Decimal
+
+from openpyxl import Workbook
+from rest_framework.negotiation import DefaultContentNegotiation
+
+from core.metrics import metrics
+
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+#On the export endpoint ?format= picks the file type (csv/excel), so DRF must not
+#treat it as a renderer override. Errors are rendered with the first renderer.
+class ExportContentNegotiation(DefaultContentNegotiation):
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+#File-like object for csv.writer that hands each line back instead of buffering it
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(headers, rows):
+    """Yield the CSV text of the header and each row, one line at a time."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([f"{value:.2f}" if isinstance(value, Decimal) else value for value in row])
+
+
+def measure_export(lines, report, export_format):
+    """Pass the lines of a streamed export through, recording its size once it is sent."""
+    size = 0
+    try:
+        for line in lines:
+            size += len(line.encode())
+            yield line
+    finally:
+        #Also runs when the client goes away mid-download, the size is then what was sent
+        metrics.observe('export_size_bytes', size, report=report, format=export_format)
+
+
+def write_excel(headers, rows, title, output):
+    """
+    Write rows to `output` as an .xlsx workbook.
+
+    Uses openpyxl's write-only mode: rows are serialized as they are appended
+    instead of being kept as cell objects, so memory does not grow with the
+    number of rows.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])  #Excel limits sheet names to 31 characters
+    sheet.append(headers)
+    for row in rows:
+        sheet.append([float(value) if isinstance(value, Decimal) else value for value in row])
+    workbook.save(output)
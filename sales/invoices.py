@@ -0,0 +1,286 @@
+import atexit
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from core.metrics import metrics
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+
+#Bump when the PDF layout changes so cached files are not served for the old layout
+LAYOUT_VERSION = 1
+
+_styles = None
+
+
+def _get_styles():
+    #Building the sample stylesheet is not free, do it once per process
+    global _styles
+    if _styles is None:
+        _styles = getSampleStyleSheet()
+    return _styles
+
+
+def invoice_payload(order, items):
+    """Everything printed on the invoice, as plain (picklable) data."""
+    return {
+        'invoice_id': order.invoice_id,
+        'customer_name': order.customer.name,
+        'customer_phone': order.customer.phone,
+        'date': order.created_at.strftime('%Y-%m-%d %H:%M'),
+        'payment_status': order.get_payment_status_display(),
+        'total': f"{order.total_amount:.2f}",
+        'items': [
+            [item.product.name, item.quantity, f"{item.price:.2f}", f"{(item.price * item.quantity):.2f}"]
+            for item in items
+        ],
+    }
+
+
+def invoice_etag(payload):
+    #Content hash of the invoice, changes whenever anything printed on it changes
+    content = json.dumps([LAYOUT_VERSION, payload], sort_keys=True).encode()
+    return hashlib.sha256(content).hexdigest()
+
+
+def render_invoice_pdf(payload):
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = _get_styles()
+    elements = []
+
+    # Header info
+    elements.append(Paragraph(f"Invoice: {payload['invoice_id']}", styles['Title']))
+    elements.append(Spacer(1, 10))
+    elements.append(Paragraph(f"Customer: {payload['customer_name']}", styles['Normal']))
+    elements.append(Paragraph(f"Phone: {payload['customer_phone']}", styles['Normal']))
+    elements.append(Paragraph(f"Date: {payload['date']}", styles['Normal']))
+    elements.append(Paragraph(f"Payment Status: {payload['payment_status']}", styles['Normal']))
+    elements.append(Spacer(1, 20))
+
+    # Items table
+    table_data = [['Product', 'Quantity', 'Unit Price', 'Subtotal']]
+    for name, quantity, price, subtotal in payload['items']:
+        table_data.append([name, str(quantity), f"${price}", f"${subtotal}"])
+    table_data.append(['', '', 'Total:', f"${payload['total']}"])
+
+    table = Table(table_data)
+    elements.append(table)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+class InvoicePDFCache:
+    """
+    Rendered invoices on disk, one file per order named `<order id>-<etag>.pdf`.
+
+    Reads touch the file's mtime, and writes evict the least recently used
+    files once the directory grows past `max_bytes`. Storing a new version
+    of an invoice removes the old one.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def directory(self):
+        return Path(self._directory or settings.INVOICE_PDF_CACHE_DIR)
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes if self._max_bytes is not None else settings.INVOICE_PDF_CACHE_MAX_BYTES
+
+    def get(self, order_id, etag):
+        path = self._path(order_id, etag)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        try:
+            os.utime(path)  #Mark as recently used
+        except FileNotFoundError:
+            pass
+        return data
+
+    def put(self, order_id, etag, data):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(order_id, etag)
+        #Write then rename so readers in other processes never see a partial file
+        tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        self.invalidate(order_id, keep=path.name)
+        self._evict()
+
+    def invalidate(self, order_id, keep=None):
+        for path in self.directory.glob(f'{order_id}-*.pdf'):
+            if path.name != keep:
+                path.unlink(missing_ok=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def _evict(self):
+        with self._lock:
+            files = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.pdf'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(files):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def _path(self, order_id, etag):
+        return self.directory / f'{order_id}-{etag}.pdf'
+
+
+invoice_cache = InvoicePDFCache()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _render_pool(workers, broken=None):
+    """The process's render pool, created on first use and shared by its requests."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        #Forked children cannot use the parent's pool, a pool whose worker died cannot be used again
+        if _pool is None or _pool_pid != os.getpid() or _pool is broken:
+            #spawn: workers only need reportlab, and forking a threaded server is unsafe
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+@atexit.register
+def _shutdown_render_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_invoices(payloads):
+    """
+    Yield `(payload, pdf)` for each `(order_id, payload)`, in input order.
+
+    Cached PDFs are reused. Misses are rendered on the process's pool of
+    INVOICE_RENDER_WORKERS processes, shared by concurrent downloads, with a
+    bounded number of jobs in flight per download so memory does not grow
+    with the batch.
+    """
+    workers = settings.INVOICE_RENDER_WORKERS or os.cpu_count() or 1
+    if workers == 1:
+        for order_id, payload in payloads:
+            yield payload, _cached_or_render(order_id, payload)
+        return
+
+    pool = _render_pool(workers)
+    pending = deque()
+    try:
+        for order_id, payload in payloads:
+            etag = invoice_etag(payload)
+            pdf = invoice_cache.get(order_id, etag)
+            job = None
+            if pdf is None:
+                try:
+                    job = pool.submit(render_invoice_pdf, payload)
+                except BrokenProcessPool:
+                    pool = _render_pool(workers, broken=pool)
+                    job = pool.submit(render_invoice_pdf, payload)
+            pending.append((order_id, payload, etag, pdf, job))
+            if len(pending) >= workers * 4:
+                yield _collect(*pending.popleft())
+        while pending:
+            yield _collect(*pending.popleft())
+    finally:
+        #Also runs when the client goes away mid-download, the pool stays for the next one
+        for _, _, _, _, job in pending:
+            if job is not None:
+                job.cancel()
+
+
+def _cached_or_render(order_id, payload):
+    etag = invoice_etag(payload)
+    pdf = invoice_cache.get(order_id, etag)
+    if pdf is None:
+        pdf = render_invoice_pdf(payload)
+        invoice_cache.put(order_id, etag, pdf)
+        metrics.inc('invoice_pdf_renders_total')
+    return pdf
+
+
+def _collect(order_id, payload, etag, pdf, job):
+    if job is not None:
+        pdf = job.result()
+        invoice_cache.put(order_id, etag, pdf)
+        metrics.inc('invoice_pdf_renders_total')
+    return payload, pdf
+
+
+#Write-only file object for ZipFile, the bytes written so far are handed out by pop()
+class _ZipStream:
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_invoice_zip(payloads):
+    """Yield a ZIP archive of invoice PDFs piece by piece, one file at a time."""
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for payload, pdf in render_invoices(payloads):
+            archive.writestr(f"Invoice_{payload['invoice_id']}.pdf", pdf)
+            yield stream.pop()
+    yield stream.pop()  #Central directory, written on close
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Subquery
+
+from inventory.models import Product
+from sales.models import OrderItem
+from sales.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Fill in unit_cost and line_profit for order items that have none, using current purchase prices"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help="Items updated per transaction")
+        parser.add_argument('--rebuild-rollup', action='store_true',
+                            help="Rebuild the daily sales rollup afterwards so it uses the new costs")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = OrderItem.objects.aggregate(last=Max('id'))['last'] or 0
+        purchase_price = Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('purchase_price')[:1])
+
+        filled = 0
+        #Walk the table in id ranges so each transaction stays short
+        for start in range(0, last_id + 1, batch_size):
+            batch = OrderItem.objects.filter(id__gte=start, id__lt=start + batch_size)
+            with transaction.atomic():
+                filled += batch.filter(unit_cost__isnull=True).update(unit_cost=purchase_price)
+                batch.filter(line_profit__isnull=True).update(
+                    line_profit=(F('price') - F('unit_cost')) * F('quantity')
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Captured cost for {filled} order items"))
+        if options['rebuild_rollup']:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuild()} rollup rows"))
@@ -0,0 +1,59 @@
+import json
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from sales.exports import csv_lines, write_excel
+
+HEADERS = ['Customer Name', 'Phone', 'Total Orders', 'Total Spent ($)']
+
+
+def synthetic_rows(count):
+    for i in range(count):
+        yield [f"Customer {i}", f"01{i:09d}", i % 50 + 1, Decimal(i % 100000) / 100]
+
+
+class Command(BaseCommand):
+    help = "Measure time and peak Python memory of the CSV and Excel export writers on synthetic rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--format', choices=['csv', 'excel', 'all'], default='all')
+        parser.add_argument('--skip-memory', action='store_true',
+                            help="Skip the second, traced run that measures peak memory")
+
+    def handle(self, *args, **options):
+        formats = ['csv', 'excel'] if options['format'] == 'all' else [options['format']]
+        results = []
+        for export_format in formats:
+            #Timing and memory come from separate runs, tracemalloc slows the writers down a lot
+            started = time.perf_counter()
+            size = self._export(export_format, options['rows'])
+            elapsed = time.perf_counter() - started
+
+            result = {
+                'format': export_format,
+                'rows': options['rows'],
+                'seconds': round(elapsed, 2),
+                'rows_per_second': round(options['rows'] / elapsed) if elapsed else None,
+                'output_mb': round(size / 1024 / 1024, 2),
+            }
+            if not options['skip_memory']:
+                tracemalloc.start()
+                self._export(export_format, options['rows'])
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                result['peak_memory_mb'] = round(peak / 1024 / 1024, 2)
+            results.append(result)
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def _export(self, export_format, rows):
+        if export_format == 'csv':
+            return sum(len(line) for line in csv_lines(HEADERS, synthetic_rows(rows)))
+        with tempfile.TemporaryFile() as output:
+            write_excel(HEADERS, synthetic_rows(rows), 'customer_wise', output)
+            return output.tell()
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailySalesRollup table from orders and order items"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First date to rebuild (YYYY-MM-DD), defaults to the beginning")
+        parser.add_argument('--end', help="Last date to rebuild (YYYY-MM-DD), defaults to today")
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else None
+        except ValueError:
+            raise CommandError("Dates must be in YYYY-MM-DD format")
+
+        count = rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} rollup rows"))
@@ -0,0 +1,200 @@
+import json
+import platform
+import random
+import time
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from customers.models import Customer
+from inventory.models import AuditLog, Product
+from sales.models import Order, OrderItem
+
+
+def percentile(values, fraction):
+    #Nearest rank on sorted values
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(fraction * len(values) + 0.5) - 1))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the API endpoints through the DRF test client against the current database "
+        "(see seed_benchmark_data) and print p50/p95 latency, query counts and peak memory as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2, help="Untimed requests per endpoint first")
+        parser.add_argument('--only', nargs='+', metavar='NAME', help="Run only these benchmarks")
+        parser.add_argument('--username', default='bench_manager', help="Manager account to call the API as")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Also write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1")
+        try:
+            user = User.objects.get(username=options['username'], role='manager')
+        except User.DoesNotExist:
+            raise CommandError(f"No manager named {options['username']}, run seed_benchmark_data first")
+
+        self.random = random.Random(options['seed'])
+        self.order_ids = list(Order.objects.values_list('id', flat=True)[:5000])
+        self.product_ids = list(Product.objects.filter(is_active=True, quantity__gt=10).values_list('id', flat=True)[:5000])
+        self.customer_ids = list(Customer.objects.filter(is_active=True).values_list('id', flat=True)[:5000])
+        self.customer_names = list(Customer.objects.values_list('name', flat=True)[:200]) or ['a']
+        if not (self.order_ids and self.product_ids and self.customer_ids):
+            raise CommandError("Benchmarks need orders, products in stock and customers, run seed_benchmark_data first")
+
+        #A real token, so authentication is part of what is measured
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        benchmarks = self.benchmarks()
+        if options['only']:
+            unknown = set(options['only']) - set(benchmarks)
+            if unknown:
+                raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}. Choose from {', '.join(benchmarks)}")
+            benchmarks = {name: benchmarks[name] for name in options['only']}
+
+        results = []
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name, (request, writes) in benchmarks.items():
+                self.stderr.write(f"{name}...")
+                results.append(self.measure(name, request, writes, options['iterations'], options['warmup']))
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'seed': options['seed'],
+                'rows': {
+                    'users': User.objects.count(),
+                    'customers': Customer.objects.count(),
+                    'products': Product.objects.count(),
+                    'orders': Order.objects.count(),
+                    'order_items': OrderItem.objects.count(),
+                    'audit_logs': AuditLog.objects.count(),
+                },
+            },
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def benchmarks(self):
+        """name -> (function making one request, whether the request writes)."""
+        return {
+            'order_create': (self.order_create, True),
+            'order_list': (lambda: self.client.get('/sales/orders/'), False),
+            'order_detail': (lambda: self.client.get(f'/sales/orders/{self.random.choice(self.order_ids)}/'), False),
+            'invoice_pdf': (lambda: self.client.get(f'/sales/orders/{self.random.choice(self.order_ids)}/invoice-pdf/'), False),
+            'export_total_summary': (lambda: self.client.get('/sales/orders/export/?report=total_summary'), False),
+            'export_customer_wise': (lambda: self.client.get('/sales/orders/export/?report=customer_wise'), False),
+            'dashboard': (lambda: self.client.get('/sales/dashboard/stats/'), False),
+            'dashboard_uncached': (self.dashboard_uncached, False),
+            'product_list': (lambda: self.client.get('/inventory/products/'), False),
+            'low_stock': (lambda: self.client.get('/inventory/products/low_stock/'), False),
+            'customer_search': (self.customer_search, False),
+            'audit_logs': (lambda: self.client.get('/inventory/audit-logs/'), False),
+        }
+
+    def order_create(self):
+        return self.client.post('/sales/orders/', {
+            'customer': self.random.choice(self.customer_ids),
+            'payment_status': 'unpaid',
+            'items': [
+                {'product': product_id, 'quantity': 1}
+                for product_id in self.random.sample(self.product_ids, min(3, len(self.product_ids)))
+            ],
+        }, format='json')
+
+    def dashboard_uncached(self):
+        cache.clear()
+        return self.client.get('/sales/dashboard/stats/')
+
+    def customer_search(self):
+        #A cashier typing the first letters of a name
+        name = self.random.choice(self.customer_names)
+        return self.client.get('/customers/', {'search': name[:3]})
+
+    def call(self, request, writes):
+        """
+        Make one request and read the whole body, writes are rolled back.
+
+        Rolling back keeps runs repeatable against the same data, at the cost
+        of leaving the commit itself and on_commit hooks out of the timing.
+        """
+        if not writes:
+            return self._read(request())
+        with transaction.atomic():
+            response = self._read(request())
+            transaction.set_rollback(True)
+        return response
+
+    @staticmethod
+    def _read(response):
+        #Streaming responses do their work while being read
+        if getattr(response, 'streaming', False):
+            response.body_size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            response.body_size = len(response.content)
+        return response
+
+    def measure(self, name, request, writes, iterations, warmup):
+        for _ in range(warmup):
+            self.call(request, writes)
+
+        timings = []
+        queries = []
+        statuses = set()
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = self.call(request, writes)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured.captured_queries))
+            statuses.add(response.status_code)
+
+        #Memory from a separate traced request, tracemalloc slows everything down
+        tracemalloc.start()
+        self.call(request, writes)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        result = {
+            'name': name,
+            'iterations': iterations,
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'queries_p50': percentile(queries, 0.5),
+            'queries_max': max(queries),
+            'peak_memory_kb': round(peak / 1024, 1),
+            'response_bytes': response.body_size,
+            'status_codes': sorted(statuses),
+        }
+        if writes:
+            result['note'] = (
+                "Each request ran in a transaction that was rolled back: "
+                "the commit and on_commit hooks (audit log writes, metrics, cache invalidation) are not measured"
+            )
+        return result
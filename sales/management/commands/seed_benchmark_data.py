@@ -0,0 +1,214 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from customers.models import Customer
+from inventory.models import AuditLog, Product, StockMovement
+from inventory.stock import fold_movements
+from sales.models import InvoiceSequence, Order, OrderItem
+from sales.rollups import rebuild
+from sales.sequences import format_invoice_id
+
+FIRST_NAMES = ['Ahmed', 'Rahim', 'Karim', 'Fatima', 'Ayesha', 'Nusrat', 'Tanvir', 'Sadia', 'Imran', 'Farhana',
+               'Hasan', 'Jannat', 'Rafiq', 'Sumaiya', 'Arif', 'Mim', 'Shakil', 'Tania', 'Rashed', 'Nadia']
+LAST_NAMES = ['Hossain', 'Rahman', 'Islam', 'Ahmed', 'Khan', 'Chowdhury', 'Akter', 'Uddin', 'Sarkar', 'Mia']
+PRODUCT_WORDS = ['Pen', 'Notebook', 'Rice', 'Oil', 'Soap', 'Tea', 'Sugar', 'Biscuit', 'Battery', 'Charger',
+                 'Cable', 'Bulb', 'Shampoo', 'Salt', 'Flour', 'Lentil', 'Milk', 'Juice', 'Towel', 'Bag']
+PRODUCT_KINDS = ['Small', 'Large', 'Premium', 'Family Pack', 'Blue', 'Red', 'Classic', 'Mini', 'Pro', 'Lite']
+PAYMENT_STATUSES = ['paid'] * 6 + ['unpaid'] * 3 + ['cancelled']
+
+PASSWORD = 'benchmark'
+
+
+def backdate(rows, timestamps):
+    """
+    Give bulk created rows their seeded created_at with a follow-up UPDATE.
+
+    auto_now_add stamps every row with now() on insert, and changing the field
+    for the duration of the seed would also affect other code in the process.
+    """
+    for row, created_at in zip(rows, timestamps):
+        row.created_at = created_at
+    if rows:
+        type(rows[0]).objects.bulk_update(rows, ['created_at'], batch_size=500)
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic users, customers, products, orders and audit logs for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--customers', type=int, default=10_000)
+        parser.add_argument('--products', type=int, default=1_000)
+        parser.add_argument('--orders', type=int, default=50_000)
+        parser.add_argument('--max-items', type=int, default=5, help="Items per order are 1 to this many")
+        parser.add_argument('--audit-logs', type=int, default=20_000)
+        parser.add_argument('--days', type=int, default=365, help="Orders are spread over this many past days")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.end = timezone.now()
+        self.start = self.end - timedelta(days=options['days'])
+
+        users = self._users(options['users'])
+        customers = self._customers(options['customers'])
+        products = self._products(options['products'])
+        orders = self._orders(options['orders'], options['max_items'], customers, products)
+        audit_logs = self._audit_logs(options['audit_logs'], products)
+
+        #Derived tables are filled the way production fills them
+        rollup_rows = rebuild()
+        fold_movements()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {users} users, {len(customers)} customers, {len(products)} products, "
+            f"{orders} orders, {audit_logs} audit logs and {rollup_rows} rollup rows "
+            f"(seed {options['seed']}, log in as bench_manager / {PASSWORD})"
+        ))
+
+    def _timestamps(self, count):
+        #Ascending with the ids, like real traffic, with some jitter
+        span = (self.end - self.start).total_seconds()
+        step = span / max(count, 1)
+        for i in range(count):
+            yield self.start + timedelta(seconds=i * step + self.random.uniform(0, step))
+
+    def _users(self, count):
+        password = make_password(PASSWORD)  #Hashing is slow, every user shares one
+        users = [
+            User(username='bench_manager', role='manager', password=password),
+            User(username='bench_staff', role='staff', password=password),
+        ]
+        users += [
+            User(username=f'bench_user_{i}', role=self.random.choice(['staff', 'staff', 'manager']), password=password)
+            for i in range(max(count - 2, 0))
+        ]
+        User.objects.bulk_create(users, batch_size=self.batch_size, ignore_conflicts=True)
+        return User.objects.filter(username__startswith='bench_').count()
+
+    def _customers(self, count):
+        timestamps = self._timestamps(count)
+        for offset in range(0, count, self.batch_size):
+            batch = []
+            stamps = []
+            for i in range(offset, min(offset + self.batch_size, count)):
+                phone = f"01{self.random.choice('3456789')}{self.random.randrange(10 ** 8):08d}"
+                batch.append(Customer(
+                    name=f"{self.random.choice(FIRST_NAMES)} {self.random.choice(LAST_NAMES)}",
+                    phone=phone,
+                    phone_normalized=Customer.normalize_phone(phone),
+                    email=f"customer{i}@example.com" if self.random.random() < 0.4 else '',
+                ))
+                stamps.append(next(timestamps))
+            backdate(Customer.objects.bulk_create(batch), stamps)
+        return list(Customer.objects.order_by('-id').values_list('id', flat=True)[:count])
+
+    def _products(self, count):
+        products = []
+        stamps = []
+        for i, created_at in enumerate(self._timestamps(count)):
+            stamps.append(created_at)
+            purchase_price = Decimal(self.random.randrange(100, 50000)) / 100
+            quantity = self.random.randrange(0, 500)
+            min_stock_level = self.random.choice([5, 10, 20])
+            products.append(Product(
+                name=f"{self.random.choice(PRODUCT_WORDS)} {self.random.choice(PRODUCT_KINDS)} {i}",
+                purchase_price=purchase_price,
+                selling_price=(purchase_price * Decimal(self.random.uniform(1.05, 1.6))).quantize(Decimal('0.01')),
+                quantity=quantity,
+                min_stock_level=min_stock_level,
+                is_low_stock=quantity < min_stock_level,
+            ))
+        products = Product.objects.bulk_create(products, batch_size=self.batch_size)
+        backdate(products, stamps)
+
+        #Opening stock in the ledger, so fold_stock_movements verifies cleanly
+        StockMovement.objects.bulk_create([
+            StockMovement(product=product, kind='restock', quantity=product.quantity, reference='Benchmark seed')
+            for product in products if product.quantity
+        ], batch_size=self.batch_size)
+        return products
+
+    def _orders(self, count, max_items, customers, products):
+        creators = list(User.objects.filter(username__startswith='bench_').values_list('id', flat=True))
+        timestamps = self._timestamps(count)
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            batch = [next(timestamps) for _ in range(size)]
+
+            #Invoice numbers come from the real sequence, so orders placed later carry on from here
+            next_number = {}
+            for year in sorted({created_at.year for created_at in batch}):
+                needed = sum(1 for created_at in batch if created_at.year == year)
+                next_number[year] = InvoiceSequence.objects.reserve(year, needed)
+
+            orders = []
+            for created_at in batch:
+                picked = self.random.sample(products, self.random.randint(1, min(max_items, len(products))))
+                items = []
+                for product in picked:
+                    quantity = self.random.randint(1, 5)
+                    items.append(OrderItem(
+                        product=product,
+                        quantity=quantity,
+                        price=product.selling_price,
+                        unit_cost=product.purchase_price,
+                        line_profit=(product.selling_price - product.purchase_price) * quantity,
+                    ))
+                number = next_number[created_at.year]
+                next_number[created_at.year] += 1
+                order = Order(
+                    invoice_id=format_invoice_id(created_at.year, number),
+                    invoice_number=number,
+                    customer_id=self.random.choice(customers),
+                    created_by_id=self.random.choice(creators),
+                    payment_status=self.random.choice(PAYMENT_STATUSES),
+                    total_amount=sum(item.price * item.quantity for item in items),
+                )
+                order._items = items
+                orders.append(order)
+
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                for order in orders:
+                    for item in order._items:
+                        item.order = order
+                OrderItem.objects.bulk_create([item for order in orders for item in order._items])
+                backdate(orders, batch)
+            created += size
+            self.stdout.write(f"  {created}/{count} orders")
+        return created
+
+    def _audit_logs(self, count, products):
+        creators = list(User.objects.filter(username__startswith='bench_').values_list('id', flat=True))
+        logs = []
+        stamps = []
+        for created_at in self._timestamps(count):
+            product = self.random.choice(products)
+            change = self.random.randint(1, 50)
+            logs.append(AuditLog(
+                product=product,
+                action=self.random.choice([
+                    f"Stock increased by {change} (from {product.quantity} to {product.quantity + change})",
+                    f"Selling price changed from ${product.purchase_price} to ${product.selling_price}",
+                    f"Product created with quantity {product.quantity}",
+                ]),
+                changed_by_id=self.random.choice(creators),
+            ))
+            stamps.append(created_at)
+            if len(logs) >= self.batch_size:
+                backdate(AuditLog.objects.bulk_create(logs), stamps)
+                logs = []
+                stamps = []
+        backdate(AuditLog.objects.bulk_create(logs), stamps)
+        return count
@@ -0,0 +1,325 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import Count, Sum
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from customers.models import Customer
+from inventory.models import Product, StockMovement
+from sales.models import DailySalesRollup, Order, OrderItem
+from .run_benchmarks import percentile
+
+
+class Worker(threading.Thread):
+    """Creates and cancels orders through the API for `duration` seconds, counting what happens."""
+
+    def __init__(self, number, command, barrier, duration):
+        super().__init__(name=f'stress-{number}')
+        self.number = number
+        self.command = command
+        self.barrier = barrier
+        self.duration = duration
+        self.random = random.Random(command.seed + number)
+        self.counts = Counter()
+        self.latencies = []   #ms per request, retries included
+        self.lock_waits = []  #ms spent in statements that wait for a lock
+        self.errors = []
+
+    def run(self):
+        try:
+            #Threads get their own connection, watch it for lock waits
+            with connection.execute_wrapper(self.time_lock_waits):
+                self.user = User.objects.get(username=f'stress_worker_{self.number}')
+                token, _ = Token.objects.get_or_create(user=self.user)
+                self.client = APIClient()
+                self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+                self.barrier.wait()
+                deadline = time.monotonic() + self.duration
+                while time.monotonic() < deadline:
+                    if self.random.random() < self.command.cancel_ratio and self.command.cancellable:
+                        self.request('cancel', self.cancel)
+                    else:
+                        self.request('create', self.create)
+        except Exception as exc:  #Reported, the invariants are still checked
+            self.errors.append(f'{type(exc).__name__}: {exc}')
+            self.barrier.abort()
+        finally:
+            connection.close()
+
+    def time_lock_waits(self, execute, sql, params, many, context):
+        #SQLite waits for the write lock in BEGIN IMMEDIATE, other databases in SELECT ... FOR UPDATE
+        if not (sql.startswith('BEGIN') or 'FOR UPDATE' in sql):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.lock_waits.append((time.perf_counter() - started) * 1000)
+
+    def request(self, kind, make_request):
+        started = time.perf_counter()
+        for attempt in range(self.command.max_retries + 1):
+            if attempt:
+                self.counts['retries'] += 1
+                time.sleep(self.random.uniform(0, 0.01 * 2 ** attempt))
+            try:
+                outcome = make_request()
+            except OperationalError as exc:
+                if 'locked' not in str(exc):
+                    raise
+                self.counts['lock_errors'] += 1
+                continue
+            except IntegrityError:
+                self.counts['integrity_errors'] += 1
+                continue
+            if outcome != 'conflict':
+                break
+            self.counts['conflicts'] += 1
+        else:
+            outcome = 'gave_up'
+        self.counts[f'{kind}_{outcome}'] += 1
+        self.latencies.append((time.perf_counter() - started) * 1000)
+
+    def create(self):
+        products = self.random.sample(self.command.product_ids, self.random.randint(1, self.command.max_items))
+        payment_status = 'paid' if self.random.random() < self.command.paid_ratio else 'unpaid'
+        response = self.client.post('/sales/orders/', {
+            'customer': self.command.customer_id,
+            'payment_status': payment_status,
+            'items': [{'product': product_id, 'quantity': self.random.randint(1, 3)} for product_id in products],
+        }, format='json')
+        if response.status_code == 201:
+            if payment_status == 'unpaid':
+                self.command.add_cancellable(response.data['id'])
+            return 'ok'
+        if 'Stock changed' in str(response.data):
+            return 'conflict'
+        if 'Insufficient stock' in str(response.data):
+            return 'sold_out'
+        return f'http_{response.status_code}'
+
+    def cancel(self):
+        #Picked without removing it, so several workers can race to cancel the same order
+        order_id = self.command.pick_cancellable(self.random)
+        if order_id is None:
+            return 'nothing_to_cancel'
+        response = self.client.patch(f'/sales/orders/{order_id}/', {'payment_status': 'cancelled'}, format='json')
+        if response.status_code == 200:
+            self.command.remove_cancellable(order_id)
+            return 'ok'
+        return f'http_{response.status_code}'
+
+
+class Command(BaseCommand):
+    help = (
+        "Create and cancel orders from many threads at once against shared products, then check "
+        "that stock, the ledger, invoice numbers, order totals and the sales rollup still agree. "
+        "Runs on a throwaway database that is removed afterwards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10, help="Seconds to run")
+        parser.add_argument('--products', type=int, default=5, help="Shared products every order draws from")
+        parser.add_argument('--stock', type=int, default=1000, help="Starting quantity of each product")
+        parser.add_argument('--max-items', type=int, default=3, help="Lines per order are 1 to this many")
+        parser.add_argument('--cancel-ratio', type=float, default=0.3, help="Share of requests that cancel an order")
+        parser.add_argument('--paid-ratio', type=float, default=0.2, help="Share of orders created as paid")
+        parser.add_argument('--max-retries', type=int, default=5, help="Retries after a lock error or stock conflict")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Also write the JSON report to this file")
+        parser.add_argument(
+            '--use-default-database', action='store_true',
+            help="Run against the configured database and keep the rows it creates, instead of a throwaway copy"
+        )
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['products'] < 1:
+            raise CommandError("--threads and --products must be at least 1")
+        if options['use_default_database']:
+            if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+                raise CommandError("Threads need a file-backed database, each opens its own connection")
+            return self.stress(options)
+
+        #A freshly migrated database the way the test runner makes one, a temporary file on SQLite
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        old_test_name = test_settings.get('NAME')
+        directory = None
+        if connection.vendor == 'sqlite':
+            directory = tempfile.mkdtemp(prefix='stress-orders-')
+            test_settings['NAME'] = os.path.join(directory, 'stress.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stress(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = old_test_name
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def stress(self, options):
+        self.seed = options['seed']
+        self.cancel_ratio = options['cancel_ratio']
+        self.paid_ratio = options['paid_ratio']
+        self.max_retries = options['max_retries']
+        self.max_items = min(options['max_items'], options['products'])
+        self.cancellable = []
+        self._cancellable_lock = threading.Lock()
+
+        run = uuid.uuid4().hex[:8]
+        self.customer_id = Customer.objects.create(name=f'Stress customer {run}', phone='01900000000').pk
+        products = [
+            Product.objects.create(
+                name=f'Stress product {run}-{i}',
+                purchase_price=Decimal('4.00'),
+                selling_price=Decimal('5.50'),
+                quantity=options['stock'],
+                min_stock_level=10,
+            )
+            for i in range(options['products'])
+        ]
+        self.product_ids = [product.pk for product in products]
+        for number in range(options['threads']):
+            User.objects.get_or_create(username=f'stress_worker_{number}', defaults={'role': 'staff'})
+        first_order_id = Order.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        connection.close()  #Workers must not share it, and SQLite keeps a file lock while it is open
+
+        self.stderr.write(f"{options['threads']} threads for {options['duration']}s on {len(products)} products...")
+        barrier = threading.Barrier(options['threads'] + 1)
+        workers = []
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for number in range(options['threads']):
+                worker = Worker(number, self, barrier, options['duration'])
+                workers.append(worker)
+                worker.start()
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                pass
+            started = time.monotonic()  #Every worker starts its clock here too
+            for worker in workers:
+                worker.join()
+            elapsed = time.monotonic() - started
+
+        counts = sum((worker.counts for worker in workers), Counter())
+        latencies = [ms for worker in workers for ms in worker.latencies]
+        lock_waits = [ms for worker in workers for ms in worker.lock_waits]
+        violations = self.check_invariants(products, options['stock'], first_order_id)
+
+        report = {
+            'meta': {
+                'database': connection.vendor,
+                'threads': options['threads'],
+                'duration_s': round(elapsed, 2),
+                'products': len(products),
+                'stock': options['stock'],
+                'seed': options['seed'],
+            },
+            'throughput': {
+                'orders_per_s': round(counts['create_ok'] / elapsed, 1),
+                'cancellations_per_s': round(counts['cancel_ok'] / elapsed, 1),
+                'requests_per_s': round(len(latencies) / elapsed, 1),
+            },
+            'latency_ms': {
+                'p50': round(percentile(latencies, 0.5), 2) if latencies else None,
+                'p95': round(percentile(latencies, 0.95), 2) if latencies else None,
+                'max': round(max(latencies), 2) if latencies else None,
+            },
+            'lock_wait_ms': {
+                'count': len(lock_waits),
+                'total': round(sum(lock_waits), 1),
+                'p95': round(percentile(lock_waits, 0.95), 2) if lock_waits else None,
+                'max': round(max(lock_waits), 2) if lock_waits else None,
+            },
+            'counts': dict(sorted(counts.items())),
+            'worker_errors': [error for worker in workers for error in worker.errors],
+            'violations': violations,
+        }
+        output = json.dumps(report, indent=2, default=str)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+        if report['worker_errors'] or any(violations.values()):
+            raise CommandError("Invariants violated or workers failed, see the report above")
+
+    def add_cancellable(self, order_id):
+        with self._cancellable_lock:
+            self.cancellable.append(order_id)
+
+    def pick_cancellable(self, rng):
+        with self._cancellable_lock:
+            return rng.choice(self.cancellable) if self.cancellable else None
+
+    def remove_cancellable(self, order_id):
+        with self._cancellable_lock:
+            if order_id in self.cancellable:
+                self.cancellable.remove(order_id)
+
+    def check_invariants(self, products, stock, first_order_id):
+        """Each check maps to the rows breaking it, all empty when the run was clean."""
+        product_ids = [product.pk for product in products]
+        quantities = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'quantity'))
+        items = OrderItem.objects.filter(product__in=product_ids)
+
+        #Every unit sold by an order that still stands has left the shelf, cancelled orders gave theirs back
+        sold = dict(
+            items.exclude(order__payment_status='cancelled').values('product')
+            .annotate(total=Sum('quantity')).values_list('product', 'total')
+        )
+        ledger = dict(
+            StockMovement.objects.filter(product__in=product_ids).values('product')
+            .annotate(total=Sum('quantity')).values_list('product', 'total')
+        )
+        rollup = dict(
+            DailySalesRollup.objects.filter(product__in=product_ids).values('product')
+            .annotate(total=Sum('quantity_sold')).values_list('product', 'total')
+        )
+        #The rollup counts what was sold, cancelling only moves the order between status counts
+        ordered = dict(items.values('product').annotate(total=Sum('quantity')).values_list('product', 'total'))
+
+        item_totals = defaultdict(Decimal)
+        for order_id, price, quantity in items.filter(order__gt=first_order_id).values_list('order', 'price', 'quantity'):
+            item_totals[order_id] += price * quantity
+        order_totals = Order.objects.filter(pk__in=list(item_totals)).values_list('pk', 'invoice_id', 'total_amount')
+
+        return {
+            'negative_stock': [
+                {'product': pk, 'quantity': quantity} for pk, quantity in quantities.items() if quantity < 0
+            ],
+            'stock_not_conserved': [
+                {'product': pk, 'quantity': quantities[pk], 'expected': stock - sold.get(pk, 0)}
+                for pk in product_ids if quantities[pk] != stock - sold.get(pk, 0)
+            ],
+            'ledger_mismatch': [
+                {'product': pk, 'quantity': quantities[pk], 'ledger': ledger.get(pk, 0)}
+                for pk in product_ids if quantities[pk] != ledger.get(pk, 0)
+            ],
+            'duplicate_invoices': list(
+                Order.objects.values('invoice_id').annotate(count=Count('id')).filter(count__gt=1)
+                .values_list('invoice_id', flat=True)
+            ),
+            'order_total_mismatch': [
+                {'invoice_id': invoice_id, 'total_amount': total, 'items_total': item_totals[pk]}
+                for pk, invoice_id, total in order_totals if total != item_totals[pk]
+            ],
+            'rollup_mismatch': [
+                {'product': pk, 'rollup': rollup.get(pk, 0), 'ordered': ordered.get(pk, 0)}
+                for pk in product_ids if rollup.get(pk, 0) != ordered.get(pk, 0)
+            ],
+        }
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.1 on 2026-10-18 05:39
+
+from django.db import migrations, models
+
+
+def seed_invoice_sequences(apps, schema_editor):
+    Order = apps.get_model('sales', 'Order')
+    InvoiceSequence = apps.get_model('sales', 'InvoiceSequence')
+
+    last_numbers = {}
+    batch = []
+    for order in Order.objects.only('id', 'invoice_id').iterator(chunk_size=2000):
+        try:
+            _, year, number = order.invoice_id.split('-')
+            year, number = int(year), int(number)
+        except ValueError:
+            continue
+        order.invoice_number = number
+        batch.append(order)
+        last_numbers[year] = max(last_numbers.get(year, 0), number)
+        if len(batch) >= 2000:
+            Order.objects.bulk_update(batch, ['invoice_number'])
+            batch = []
+    if batch:
+        Order.objects.bulk_update(batch, ['invoice_number'])
+
+    InvoiceSequence.objects.bulk_create([
+        InvoiceSequence(year=year, last_number=number)
+        for year, number in last_numbers.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_alter_order_payment_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('year', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='invoice_number',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(seed_invoice_sequences, migrations.RunPython.noop),
+    ]
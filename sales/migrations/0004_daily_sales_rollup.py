@@ -0,0 +1,69 @@
+# Generated by Django 6.0.1 on 2026-10-18 05:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollup(apps, schema_editor):
+    Order = apps.get_model('sales', 'Order')
+    OrderItem = apps.get_model('sales', 'OrderItem')
+    DailySalesRollup = apps.get_model('sales', 'DailySalesRollup')
+
+    rows = {}
+    for row in Order.objects.annotate(date=TruncDate('created_at')).values('date').annotate(
+        order_count=Count('id'),
+        paid_count=Count('id', filter=Q(payment_status='paid')),
+        unpaid_count=Count('id', filter=Q(payment_status='unpaid')),
+        cancelled_count=Count('id', filter=Q(payment_status='cancelled')),
+        sales_total=Sum('total_amount'),
+    ).order_by():
+        date = row.pop('date')
+        rows[(date, None)] = DailySalesRollup(date=date, **row)
+
+    for row in OrderItem.objects.annotate(date=TruncDate('order__created_at')).values('date', 'product').annotate(
+        order_count=Count('order', distinct=True),
+        quantity_sold=Sum('quantity'),
+        sales_total=Sum(F('price') * F('quantity'), output_field=DecimalField()),
+        cost_total=Sum(F('product__purchase_price') * F('quantity'), output_field=DecimalField()),
+    ).order_by():
+        date, product_id = row.pop('date'), row.pop('product')
+        row['profit_total'] = row['sales_total'] - row['cost_total']
+        rows[(date, product_id)] = DailySalesRollup(date=date, product_id=product_id, **row)
+        day = rows[(date, None)]
+        day.cost_total += row['cost_total']
+        day.profit_total += row['profit_total']
+
+    DailySalesRollup.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+        ('sales', '0003_invoice_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('unpaid_count', models.IntegerField(default=0)),
+                ('cancelled_count', models.IntegerField(default=0)),
+                ('quantity_sold', models.IntegerField(default=0)),
+                ('sales_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('profit_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='inventory.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='unique_rollup_date_product'), models.UniqueConstraint(condition=models.Q(('product__isnull', True)), fields=('date',), name='unique_rollup_date_total')],
+            },
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
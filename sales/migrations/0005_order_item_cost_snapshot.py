@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-18 05:48
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_costs(apps, schema_editor):
+    OrderItem = apps.get_model('sales', 'OrderItem')
+    Product = apps.get_model('inventory', 'Product')
+
+    #Best we can do for existing rows is the purchase price as it is today
+    OrderItem.objects.filter(unit_cost__isnull=True).update(
+        unit_cost=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('purchase_price')[:1])
+    )
+    OrderItem.objects.filter(line_profit__isnull=True).update(
+        line_profit=(F('price') - F('unit_cost')) * F('quantity')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+        ('sales', '0004_daily_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='line_profit',
+            field=models.DecimalField(decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_cost',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_costs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-18 06:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_phone_normalized'),
+        ('sales', '0007_order_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_status', 'created_at', 'id'], name='order_status_created_idx'),
+        ),
+    ]
@@ -1,8 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 
 # Create your models here.
 class Order(models.Model):
     invoice_id = models.CharField(max_length=50, unique=True, editable=False)
+    #Numeric part of invoice_id, sorts correctly past 9999 where the string does not
+    invoice_number = models.PositiveIntegerField(null=True, editable=False)
     customer = models.ForeignKey('customers.Customer', on_delete=models.CASCADE)
     created_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True)
     payment_status = models.CharField(max_length=20, choices=[
@@ -13,23 +16,24 @@ class Order(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),  #Keyset pagination
+            models.Index(fields=['payment_status', 'created_at', 'id'], name='order_status_created_idx'),  #?payment_status= lists
+        ]
+
     def __str__(self):
         return self.invoice_id
     
     # Generates an unique invoice
     def save(self, *args, **kwargs):
         if not self.invoice_id:
-            from datetime import datetime
-            year = datetime.now().year  #Current year
-        #Django uses the pattern 'field_name__lookup_type'. here '__startswith' is a lookup condition
-        #Here Django is saying filter where invoice_id is like 'INV-2024'
-            last_order = Order.objects.filter(invoice_id__startswith=f'INV-{year}').order_by('invoice_id').last()
-            if last_order:
-                last_num = int(last_order.invoice_id.split('-')[-1])
-                new_num = last_num + 1
-            else:
-                new_num = 1
-            self.invoice_id = f'INV-{year}-{new_num:04d}'
+            from django.utils import timezone
+            from .sequences import allocate_invoice_numbers, format_invoice_id
+            year = timezone.now().year  #Current year
+            #The number comes from the per-year InvoiceSequence row, no scan over existing orders
+            self.invoice_number = allocate_invoice_numbers(year)[0]
+            self.invoice_id = format_invoice_id(year, self.invoice_number)
         super().save(*args, **kwargs)
 
 
@@ -38,6 +42,68 @@ class OrderItem(models.Model):
     product = models.ForeignKey('inventory.Product', on_delete=models.CASCADE)
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    #Purchase price and profit at the time of sale, so later price changes do not rewrite history
+    #and profit reports are plain sums over this table. NULL means the cost was never captured.
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    line_profit = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+
+    def __str__(self):
+        return f"{self.product.name} x {self.quantity}"
+
+    def save(self, *args, **kwargs):
+        if self.unit_cost is None:
+            self.unit_cost = self.product.purchase_price
+        self.line_profit = (self.price - self.unit_cost) * self.quantity
+        super().save(*args, **kwargs)
+
+
+class InvoiceSequenceManager(models.Manager):
+    def reserve(self, year, count=1):
+        """Reserve `count` consecutive invoice numbers for `year` and return the first one."""
+        with transaction.atomic():
+            #The UPDATE takes the row lock, so the read below sees our own increment
+            updated = self.filter(year=year).update(last_number=F('last_number') + count)
+            if not updated:
+                #First invoice of the year. If another worker inserts the row first we just retry the UPDATE.
+                self.bulk_create([self.model(year=year)], ignore_conflicts=True)
+                self.filter(year=year).update(last_number=F('last_number') + count)
+            last_number = self.filter(year=year).values_list('last_number', flat=True).get()
+        return last_number - count + 1
+
+
+#One row per year holding the last invoice number handed out
+class InvoiceSequence(models.Model):
+    year = models.PositiveIntegerField(primary_key=True)
+    last_number = models.PositiveIntegerField(default=0)
+
+    objects = InvoiceSequenceManager()
+
+    def __str__(self):
+        return f"{self.year}: {self.last_number}"
+
+
+#Pre-aggregated sales per day. Rows without a product hold the totals for the
+#day, rows with a product hold that product's share. Kept up to date by
+#sales/rollups.py, rebuilt from scratch with `manage.py rebuild_sales_rollup`.
+class DailySalesRollup(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey('inventory.Product', on_delete=models.CASCADE, null=True, blank=True)
+    order_count = models.IntegerField(default=0)
+    paid_count = models.IntegerField(default=0)
+    unpaid_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+    quantity_sold = models.IntegerField(default=0)
+    sales_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    profit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_rollup_date_product'),
+            models.UniqueConstraint(
+                fields=['date'], condition=models.Q(product__isnull=True), name='unique_rollup_date_total'
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.product.name} x {self.quantity}"
\ No newline at end of file
+        return f"{self.date} {self.product_id or 'total'}"
@@ -0,0 +1,32 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Newline delimited JSON, one object per line.
+
+    Returns a generator so large uploads are read line by line instead of
+    being loaded at once. A line that is not valid JSON is yielded as a
+    ParseError so the caller can report it and carry on with the next line.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        return self._iter_lines(stream, encoding)
+
+    def _iter_lines(self, stream, encoding):
+        if stream is None:
+            return
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line.decode(encoding))
+            except ValueError as exc:
+                yield ParseError(f'NDJSON parse error - {exc}')
@@ -0,0 +1,155 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.dates import day_bounds
+from .cache import invalidate_dashboard
+from .models import DailySalesRollup, Order, OrderItem
+
+STATUS_FIELDS = {
+    'paid': 'paid_count',
+    'unpaid': 'unpaid_count',
+    'cancelled': 'cancelled_count',
+}
+
+DECIMAL_FIELDS = {'sales_total', 'cost_total', 'profit_total'}
+
+
+def record_orders(orders, sign=1):
+    """
+    Add newly created orders to the rollup (sign=-1 takes deleted orders out).
+
+    Items are read from `order._created_items` when the order was just built
+    by place_orders(), otherwise from the database.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))  #(date, product_id or None) -> field -> delta
+    for order in orders:
+        date = timezone.localdate(order.created_at)
+        day = deltas[(date, None)]
+        day['order_count'] += sign
+        day[STATUS_FIELDS[order.payment_status]] += sign
+        day['sales_total'] += sign * order.total_amount
+
+        items = getattr(order, '_created_items', None)
+        if items is None:
+            items = order.items.select_related('product')
+        products_seen = set()
+        for item in items:
+            unit_cost = item.unit_cost if item.unit_cost is not None else item.product.purchase_price
+            cost = unit_cost * item.quantity
+            sales = item.price * item.quantity
+            line = deltas[(date, item.product_id)]
+            if item.product_id not in products_seen:
+                line['order_count'] += sign
+                products_seen.add(item.product_id)
+            line['quantity_sold'] += sign * item.quantity
+            line['sales_total'] += sign * sales
+            line['cost_total'] += sign * cost
+            line['profit_total'] += sign * (sales - cost)
+            day['cost_total'] += sign * cost
+            day['profit_total'] += sign * (sales - cost)
+    _apply(deltas)
+
+
+def record_status_change(order, old_status, new_status):
+    if old_status == new_status:
+        return
+    date = timezone.localdate(order.created_at)
+    _apply({(date, None): {STATUS_FIELDS[old_status]: -1, STATUS_FIELDS[new_status]: 1}})
+
+
+#Write deltas as increments: one INSERT ... IGNORE for missing rows, then one UPDATE per
+#date for the day totals and one for all product rows of that date.
+def _apply(deltas):
+    if not deltas:
+        return
+    with transaction.atomic():
+        DailySalesRollup.objects.bulk_create(
+            [DailySalesRollup(date=date, product_id=product_id) for date, product_id in deltas],
+            ignore_conflicts=True
+        )
+
+        by_date = defaultdict(dict)
+        for (date, product_id), fields in deltas.items():
+            by_date[date][product_id] = fields
+
+        for date, rows in by_date.items():
+            if None in rows:
+                day_updates = {field: F(field) + delta for field, delta in rows.pop(None).items() if delta}
+                if day_updates:
+                    DailySalesRollup.objects.filter(date=date, product__isnull=True).update(**day_updates)
+            if not rows:
+                continue
+            updates = {}
+            for field in {field for fields in rows.values() for field in fields}:
+                output_field = DecimalField() if field in DECIMAL_FIELDS else IntegerField()
+                updates[field] = F(field) + Case(
+                    *[When(product_id=product_id, then=Value(fields.get(field, 0)))
+                      for product_id, fields in rows.items()],
+                    default=Value(Decimal(0) if field in DECIMAL_FIELDS else 0),
+                    output_field=output_field
+                )
+            DailySalesRollup.objects.filter(date=date, product_id__in=list(rows)).update(**updates)
+
+        invalidate_dashboard()
+
+
+def rebuild(start=None, end=None):
+    """Recompute the rollup from Order and OrderItem, optionally only for a date range."""
+    orders = Order.objects.all()
+    items = OrderItem.objects.all()
+    lower, upper = day_bounds(start, end)
+    if lower:
+        orders = orders.filter(created_at__gte=lower)
+        items = items.filter(order__created_at__gte=lower)
+    if upper:
+        orders = orders.filter(created_at__lt=upper)
+        items = items.filter(order__created_at__lt=upper)
+
+    cost = F('unit_cost') * F('quantity')
+    sales = F('price') * F('quantity')
+
+    rows = {}
+    for row in orders.annotate(date=TruncDate('created_at')).values('date').annotate(
+        order_count=Count('id'),
+        paid_count=Count('id', filter=Q(payment_status='paid')),
+        unpaid_count=Count('id', filter=Q(payment_status='unpaid')),
+        cancelled_count=Count('id', filter=Q(payment_status='cancelled')),
+        sales_total=Sum('total_amount'),
+    ).order_by():
+        rows[(row.pop('date'), None)] = DailySalesRollup(**row)
+
+    product_rows = items.annotate(date=TruncDate('order__created_at')).values('date', 'product').annotate(
+        order_count=Count('order', distinct=True),
+        quantity_sold=Sum('quantity'),
+        sales_total=Sum(sales, output_field=DecimalField()),
+        cost_total=Sum(cost, output_field=DecimalField()),
+        profit_total=Sum('line_profit'),
+    ).order_by()
+    for row in product_rows:
+        date, product_id = row.pop('date'), row.pop('product')
+        row['cost_total'] = row['cost_total'] or 0
+        row['profit_total'] = row['profit_total'] or 0
+        rows[(date, product_id)] = DailySalesRollup(**row)
+        day = rows[(date, None)]
+        day.cost_total += row['cost_total']
+        day.profit_total += row['profit_total']
+
+    for (date, product_id), rollup in rows.items():
+        rollup.date = date
+        rollup.product_id = product_id
+
+    with transaction.atomic():
+        existing = DailySalesRollup.objects.all()
+        if start:
+            existing = existing.filter(date__gte=start)
+        if end:
+            existing = existing.filter(date__lte=end)
+        existing.delete()
+        DailySalesRollup.objects.bulk_create(rows.values(), batch_size=1000)
+        invalidate_dashboard()
+    return len(rows)
@@ -0,0 +1,17 @@
+from .models import InvoiceSequence
+
+
+def format_invoice_id(year, number):
+    return f'INV-{year}-{number:04d}'
+
+
+def allocate_invoice_numbers(year, count=1):
+    """
+    Reserve `count` consecutive invoice numbers for `year` and return them as a list.
+
+    The reservation is part of the caller's transaction, so the numbers of a
+    rolled back order are handed out again and numbering stays gapless. Other
+    writers wait on the InvoiceSequence row until the caller commits.
+    """
+    first = InvoiceSequence.objects.reserve(year, count)
+    return list(range(first, first + count))
@@ -1,6 +1,7 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import Order, OrderItem
-from inventory.models import Product
+from .services import place_orders
 
 class OrderItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
@@ -11,54 +12,51 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'price']
 
 
+class OrderItemCreateSerializer(serializers.Serializer):
+    #Plain ids here, products are fetched for the whole basket in one query
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True)  #Nested serializer for multiple products
+    items = OrderItemCreateSerializer(many=True)  #Nested serializer for multiple products
     
     class Meta:
         model = Order
         fields = ['customer', 'payment_status', 'items']
+
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError("An order needs at least one item.")
+        #Unknown product ids are reported by place_orders(), from the rows it locks anyway
+        return items
     
     def create(self, validated_data):
-        items_data = validated_data.pop('items')
-        
-        #Create order
-        order = Order.objects.create(
-            customer=validated_data['customer'],
-            payment_status=validated_data['payment_status'],
-            created_by=self.context['request'].user  #Get user from request
-        )
-        
-        total = 0
-        
-        #Create order items and update inventory
-        for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
-            
-            if product.quantity < quantity:
-                raise serializers.ValidationError(
-                    f"Insufficient stock for {product.name}. Available: {product.quantity}"
-                )
-            
-            #Create order item with current selling price
-            order_item = OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                price=product.selling_price  # Lock in current price
-            )
-            
-            #Decrease inventory
-            product.quantity -= quantity
-            product.save()
-            
-            total += order_item.price * order_item.quantity
-        
-        #Update order total
-        order.total_amount = total
-        order.save()
-        
-        return order
+        with transaction.atomic():
+            orders, errors = place_orders([validated_data], self.context['request'].user)
+        if errors:
+            raise serializers.ValidationError(errors[0])
+        return orders[0]
+
+    def to_representation(self, instance):
+        #Answer from the items built in create() instead of reading them back
+        items = getattr(instance, '_created_items', None)
+        if items is None:
+            items = instance.items.select_related('product')
+        return {
+            'id': instance.pk,
+            'invoice_id': instance.invoice_id,
+            'customer': instance.customer_id,
+            'payment_status': instance.payment_status,
+            'items': OrderItemSerializer(items, many=True).data,
+        }
+
+
+class BulkOrderSerializer(serializers.Serializer):
+    #Shape check only, customers and products are looked up once per chunk
+    customer = serializers.IntegerField()
+    payment_status = serializers.ChoiceField(choices=Order._meta.get_field('payment_status').choices)
+    items = OrderItemCreateSerializer(many=True, allow_empty=False)
 
 
 class OrderListSerializer(serializers.ModelSerializer):
@@ -75,6 +73,9 @@ class OrderListSerializer(serializers.ModelSerializer):
         ]
     
     def get_items_count(self, obj):
+        #Annotated by OrderViewSet.get_queryset() for list pages
+        if hasattr(obj, 'items_count'):
+            return obj.items_count
         return obj.items.count()
 
 class OrderUpdateSerializer(serializers.ModelSerializer):
@@ -107,8 +108,9 @@ class OrderDetailSerializer(serializers.ModelSerializer):
     def get_profit(self, obj):
         request = self.context.get('request')
         if request and hasattr(request.user, 'role') and request.user.role == 'manager':
-            profit = 0
-            for item in obj.items.all():
-                profit += (item.price - item.product.purchase_price) * item.quantity
+            #Computed in the database by OrderViewSet.get_queryset() when available
+            if hasattr(obj, 'profit'):
+                return float(obj.profit or 0)
+            profit = sum(item.line_profit or 0 for item in obj.items.all())
             return float(profit)
         return None
\ No newline at end of file
@@ -0,0 +1,153 @@
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework import serializers
+
+from core.metrics import metrics
+from inventory.audit import write_audit_logs
+from inventory.models import Product, AuditLog, StockMovement
+from inventory.stock import move_stock
+from .models import Order, OrderItem
+from .rollups import record_orders
+from .sequences import allocate_invoice_numbers, format_invoice_id
+
+
+def place_orders(orders_data, user):
+    """
+    Create a batch of orders with set-based writes. Must run inside transaction.atomic().
+
+    `orders_data` is a list of dicts with `customer`, `payment_status` and
+    `items` ([{'product': <id>, 'quantity': <n>}, ...]). Orders are checked
+    against stock in sequence, so an order that does not fit what is left is
+    rejected without affecting the others.
+
+    Returns `(orders, errors)`: the created orders in input order and a dict
+    of input index -> error message for the rejected ones.
+    """
+    product_ids = {item['product'] for data in orders_data for item in data['items']}
+
+    #Lock every product in the batch at once and read stock inside the transaction
+    products = Product.objects.select_for_update().in_bulk(product_ids)
+    available = {pk: product.quantity for pk, product in products.items()}
+
+    accepted = []  #(index, data, quantity per product)
+    errors = {}
+    for index, data in enumerate(orders_data):
+        #Total quantity per product, the same product can appear on several lines
+        requested = {}
+        for item in data['items']:
+            requested[item['product']] = requested.get(item['product'], 0) + item['quantity']
+
+        missing = sorted(product_id for product_id in requested if product_id not in products)
+        error = f"Invalid product id(s): {', '.join(str(pk) for pk in missing)}" if missing else None
+        if error is None:
+            for product_id, quantity in requested.items():
+                if available[product_id] < quantity:
+                    error = f"Insufficient stock for {products[product_id].name}. Available: {available[product_id]}"
+                    metrics.inc('stock_outs_total')
+                    break
+        if error:
+            errors[index] = error
+            continue
+
+        for product_id, quantity in requested.items():
+            available[product_id] -= quantity
+        accepted.append((index, data, requested))
+
+    if not accepted:
+        return [], errors
+
+    #One sequence UPDATE for the whole batch
+    year = timezone.now().year
+    numbers = allocate_invoice_numbers(year, len(accepted))
+
+    orders = []
+    order_items = []
+    for (index, data, requested), number in zip(accepted, numbers):
+        #Lock in current selling and purchase prices, the total is known before the order is written
+        items = []
+        for item in data['items']:
+            product = products[item['product']]
+            items.append(OrderItem(
+                product=product,
+                quantity=item['quantity'],
+                price=product.selling_price,
+                unit_cost=product.purchase_price,
+                line_profit=(product.selling_price - product.purchase_price) * item['quantity']
+            ))
+        order = Order(
+            invoice_id=format_invoice_id(year, number),
+            invoice_number=number,
+            customer=data['customer'],
+            payment_status=data['payment_status'],
+            created_by=user,
+            total_amount=sum(item.price * item.quantity for item in items)
+        )
+        order._created_items = items
+        orders.append(order)
+        order_items.extend(items)
+
+    Order.objects.bulk_create(orders)
+    for order in orders:
+        for item in order._created_items:
+            item.order = order
+    OrderItem.objects.bulk_create(order_items)
+
+    #Decrease inventory with a single conditional UPDATE.
+    #A row only matches while it still has enough stock, so a failure means we lost a race.
+    movements = [
+        StockMovement(product_id=product_id, kind='sale', quantity=-quantity, reference=order.invoice_id, created_by=user)
+        for order, (_, _, requested) in zip(orders, accepted)
+        for product_id, quantity in requested.items()
+    ]
+    if not move_stock(movements, check_available=True):
+        raise serializers.ValidationError("Stock changed while placing the order. Please try again.")
+
+    #Product.save() is bypassed above, so write the stock audit rows ourselves
+    stock = {pk: product.quantity for pk, product in products.items()}
+    audit_logs = []
+    for order, (_, _, requested) in zip(orders, accepted):
+        for product_id, quantity in requested.items():
+            audit_logs.append(AuditLog(
+                product=products[product_id],
+                action=(
+                    f"Stock decreased by {quantity} (from {stock[product_id]} "
+                    f"to {stock[product_id] - quantity}) due to order #{order.invoice_id}"
+                ),
+                changed_by=user
+            ))
+            stock[product_id] -= quantity
+    write_audit_logs(audit_logs)
+
+    record_orders(orders)
+    transaction.on_commit(lambda: metrics.inc('orders_created_total', len(orders)))
+    return orders, errors
+
+
+def cancel_order(order, user):
+    """
+    Put the stock of a cancelled order back. Must run inside transaction.atomic().
+
+    One grouped read of the items, one UPDATE for all products, one ledger
+    INSERT and one audit batch, however many lines the order has.
+    """
+    transaction.on_commit(lambda: metrics.inc('order_cancellations_total'))
+    quantities = dict(
+        order.items.values('product').annotate(total=Sum('quantity')).values_list('product', 'total')
+    )
+    if not quantities:
+        return
+
+    move_stock([
+        StockMovement(product_id=product_id, kind='cancellation', quantity=quantity, reference=order.invoice_id, created_by=user)
+        for product_id, quantity in quantities.items()
+    ])
+
+    write_audit_logs([
+        AuditLog(
+            product_id=product_id,
+            action=f"Stock increased by {quantity} due to order #{order.invoice_id} cancellation",
+            changed_by=user
+        )
+        for product_id, quantity in quantities.items()
+    ])
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from inventory.models import Product
+from .cache import invalidate_dashboard
+from .models import Order
+
+# Order writes that go through place_orders() or the rollup bypass these
+# signals, sales/rollups.py invalidates the dashboard for them.
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_dashboard_cache(sender, **kwargs):
+    invalidate_dashboard()
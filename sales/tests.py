@@ -1,3 +1,568 @@
-from django.test import TestCase
+import zipfile
+import json
+from datetime import date, datetime, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from core.metrics import metrics
+from core.pagination import KeysetPagination
+from core.testing import QueryPlanAssertions
+from customers.models import Customer
+from inventory.models import AuditLog, Product, StockMovement
+from inventory.stock import verify_snapshots
+from . import invoices
+from .models import DailySalesRollup, InvoiceSequence, Order, OrderItem
+from .rollups import rebuild
+from .views import OrderFilter
+
+
+@skipUnless(connection.vendor == 'sqlite', "Query plans are checked on SQLite")
+class OrderQueryPlanTests(QueryPlanAssertions, TestCase):
+    """The hot order and dashboard queries must stay index lookups."""
+
+    ordering = ['-created_at', '-id']
+
+    def test_list_page(self):
+        self.assertUsesIndex(Order.objects.order_by(*self.ordering)[:51], 'order_created_id_idx')
+
+    def test_list_next_page(self):
+        after = KeysetPagination()._after(self.ordering, ['2026-01-01T00:00:00+00:00', 100])
+        self.assertUsesIndex(
+            Order.objects.filter(after).order_by(*self.ordering)[:51], 'order_created_id_idx'
+        )
+
+    def test_list_by_payment_status(self):
+        self.assertUsesIndex(
+            Order.objects.filter(payment_status='unpaid').order_by(*self.ordering)[:51],
+            'order_status_created_idx'
+        )
+
+    def test_list_by_date_range(self):
+        orders = OrderFilter(
+            data={'start_date': '2026-01-01', 'end_date': '2026-01-31'}, queryset=Order.objects.all()
+        ).qs
+        self.assertUsesIndex(orders.order_by(*self.ordering)[:51], 'order_created_id_idx')
+
+    def test_invoice_lookup(self):
+        self.assertUsesIndex(Order.objects.filter(invoice_id='INV-2026-0001'))
+
+    def test_order_items(self):
+        self.assertUsesIndex(OrderItem.objects.filter(order=1))
+
+    def test_dashboard_period_totals(self):
+        self.assertUsesIndex(
+            DailySalesRollup.objects.filter(
+                product__isnull=True, date__gte=date(2026, 1, 1), date__lte=date(2026, 1, 31)
+            )
+        )
+
+    def test_dashboard_best_sellers(self):
+        self.assertUsesIndex(
+            DailySalesRollup.objects.filter(date=date(2026, 1, 1), product__isnull=False)
+        )
+
+
+class OrderQueryCountTests(APITestCase):
+    """List and detail cost the same number of queries however many orders and lines there are."""
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x', role='manager'))
+        products = [
+            Product.objects.create(name=f'Pen {i}', purchase_price=5, selling_price=10, quantity=10, min_stock_level=2)
+            for i in range(3)
+        ]
+        for i in range(4):
+            order = Order.objects.create(customer=Customer.objects.create(name=f'Customer {i}', phone=f'0171100000{i}'))
+            for product in products:
+                OrderItem.objects.create(order=order, product=product, quantity=1, price=10)
+        self.order = order
+
+    def test_list(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/sales/orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([order['items_count'] for order in response.data['results']], [3] * 4)
+
+    def test_detail(self):
+        #The order with its customer and creator, then the items with their products
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/sales/orders/{self.order.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['items']), 3)
+
+
+@skipUnless(connection.vendor == 'sqlite', "Full-text search uses SQLite FTS5")
+class OrderSearchTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x', role='manager'))
+        self.customer = Customer.objects.create(name='Acme Traders', phone='01711000000')
+
+    def search(self, **params):
+        response = self.client.get('/sales/orders/', params)
+        self.assertEqual(response.status_code, 200)
+        return [order['invoice_id'] for order in response.data['results']]
+
+    @override_settings(SEARCH_MAX_RESULTS=2)
+    def test_filters_apply_before_the_result_cap(self):
+        for _ in range(3):
+            Order.objects.create(customer=self.customer, payment_status='paid')
+        unpaid = Order.objects.create(customer=self.customer, payment_status='unpaid')
+
+        self.assertEqual(self.search(search='acme', payment_status='unpaid'), [unpaid.invoice_id])
+        self.assertEqual(len(self.search(search='acme')), 2)
+
+    def test_edits_are_searchable_after_migrate(self):
+        #The test database went through every migration, including the table rebuilds that drop triggers
+        product = Product.objects.create(
+            name='Blue Pen', purchase_price=5, selling_price=10, quantity=10, min_stock_level=2
+        )
+        order = Order.objects.create(customer=self.customer, payment_status='unpaid')
+        self.customer.name = 'Zenith Stores'
+        self.customer.save()
+        product.name = 'Gel Marker'
+        product.save()
+
+        customers = self.client.get('/customers/', {'search': 'zenith'}).data['results']
+        self.assertEqual([customer['id'] for customer in customers], [self.customer.pk])
+        products = self.client.get('/inventory/products/', {'search': 'marker'}).data['results']
+        self.assertEqual([product['id'] for product in products], [product.pk])
+        self.assertEqual(self.search(search='zenith'), [order.invoice_id])
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x', role='manager'))
+        Order.objects.create(customer=Customer.objects.create(name='Acme', phone='01711000000'), payment_status='paid')
+
+    def test_reports(self):
+        for report in ('total_summary', 'customer_wise'):
+            for export_format in ('csv', 'excel'):
+                response = self.client.get('/sales/orders/export/', {'report': report, 'format': export_format})
+                self.assertEqual(response.status_code, 200, (report, export_format))
+                self.assertIn(f'{report}_report', response['Content-Disposition'])
+                b''.join(response.streaming_content)
+
+    def test_unknown_report(self):
+        for report in ('a/b', 'summary'):
+            response = self.client.get('/sales/orders/export/', {'report': report, 'format': 'excel'})
+            self.assertEqual(response.status_code, 400, report)
+
+    def test_size_metric_only_labels_known_reports(self):
+        with mock.patch.object(metrics, 'observe') as observe:
+            for report in ('total_summary', 'nonsense'):
+                response = self.client.get('/sales/orders/export/', {'report': report, 'format': 'csv'})
+                if response.status_code == 200:
+                    b''.join(response.streaming_content)
+        sizes = [call for call in observe.call_args_list if call.args[0] == 'export_size_bytes']
+        self.assertEqual([call.kwargs['report'] for call in sizes], ['total_summary'])
+
+
+@override_settings(INVOICE_ZIP_MAX_ORDERS=2)
+class InvoiceZipTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x', role='manager'))
+        customer = Customer.objects.create(name='Acme', phone='01711000000')
+        self.orders = [Order.objects.create(customer=customer) for _ in range(3)]
+
+    def download(self, orders):
+        response = self.client.get('/sales/orders/invoices-zip/', {'ids': ','.join(str(order.pk) for order in orders)})
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            return sorted(archive.namelist())
+
+    def test_downloads_share_one_render_pool(self):
+        with override_settings(INVOICE_RENDER_WORKERS=2):
+            self.assertEqual(self.download(self.orders[:2]), sorted(
+                f'Invoice_{order.invoice_id}.pdf' for order in self.orders[:2]
+            ))
+            pool = invoices._pool
+            self.assertEqual(len(self.download(self.orders[1:])), 2)
+        self.assertIsNotNone(pool)
+        self.assertIs(invoices._pool, pool)
+
+    def test_too_many_orders(self):
+        response = self.client.get('/sales/orders/invoices-zip/')
+        self.assertEqual(response.status_code, 400)
+
+
+class InvoicePdfTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x', role='manager'))
+        customer = Customer.objects.create(name='Acme', phone='01711000000')
+        self.order = Order.objects.create(customer=customer)
+        product = Product.objects.create(name='Pen', purchase_price=5, selling_price=10, quantity=10, min_stock_level=2)
+        OrderItem.objects.create(order=self.order, product=product, quantity=1, price=10)
+
+    def download(self, **headers):
+        return self.client.get(f'/sales/orders/{self.order.pk}/invoice-pdf/', headers=headers)
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        etag = response['ETag']
+
+        for header in (etag, f'W/{etag}', f'"other", W/{etag}', '*'):
+            with mock.patch.object(invoices.invoice_cache, 'get') as cache_get:
+                response = self.download(if_none_match=header)
+            self.assertEqual(response.status_code, 304, header)
+            self.assertEqual(response['ETag'], etag)
+            cache_get.assert_not_called()
+
+        self.assertEqual(self.download(if_none_match='"other"').status_code, 200)
+
+    def test_etag_changes_with_the_invoice(self):
+        etag = self.download()['ETag']
+        OrderItem.objects.filter(order=self.order).update(quantity=2)
+        response = self.download(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class PlaceOrdersTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('staff', password='x', role='staff'))
+        self.customer = Customer.objects.create(name='Acme', phone='01711000000')
+        self.pen = Product.objects.create(name='Pen', purchase_price=5, selling_price=10, quantity=10, min_stock_level=2)
+        self.ink = Product.objects.create(name='Ink', purchase_price=2, selling_price=3, quantity=4, min_stock_level=1)
+
+    def order(self, *items):
+        return {
+            'customer': self.customer.pk,
+            'payment_status': 'unpaid',
+            'items': [{'product': product.pk, 'quantity': quantity} for product, quantity in items],
+        }
+
+    def stock(self):
+        return {product.name: product.quantity for product in Product.objects.order_by('name')}
+
+    def sales(self):
+        return sorted(StockMovement.objects.filter(kind='sale').values_list('product__name', 'quantity'))
+
+    def test_stock_is_decremented(self):
+        #The same product on two lines is taken once, for both lines together
+        response = self.client.post('/sales/orders/', self.order((self.pen, 2), (self.ink, 1), (self.pen, 3)), format='json')
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual((response.data['id'], response.data['invoice_id']), (order.pk, order.invoice_id))
+        self.assertEqual(order.total_amount, 53)
+        self.assertEqual(self.stock(), {'Ink': 3, 'Pen': 5})
+        self.assertEqual(self.sales(), [('Ink', -1), ('Pen', -5)])
+
+    def test_products_are_read_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/sales/orders/', self.order((self.pen, 2), (self.ink, 1)), format='json')
+        self.assertEqual(response.status_code, 201)
+        #Loaded once under the row lock, the low-stock check afterwards only reads the crossed rows
+        loads = [query['sql'] for query in queries if query['sql'].startswith('SELECT "inventory_product"."id", "inventory_product"."name"')]
+        self.assertEqual(len(loads), 1, loads)
+
+    def test_unknown_products(self):
+        data = self.order((self.pen, 1))
+        data['items'] += [{'product': 999, 'quantity': 1}, {'product': 998, 'quantity': 1}]
+        response = self.client.post('/sales/orders/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Invalid product id(s): 998, 999', str(response.data))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(), {'Ink': 4, 'Pen': 10})
+
+    def test_stock_out_leaves_stock_untouched(self):
+        response = self.client.post('/sales/orders/', self.order((self.pen, 2), (self.ink, 5)), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Insufficient stock for Ink', str(response.data))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(), {'Ink': 4, 'Pen': 10})
+        self.assertEqual(self.sales(), [])
+
+    def test_bulk_chunk_with_one_bad_order(self):
+        #The second order fits on its own but not after the first, the third still fits
+        orders = [self.order((self.ink, 3)), self.order((self.ink, 2)), self.order((self.pen, 4), (self.ink, 1))]
+        response = self.client.post('/sales/orders/bulk/', orders, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['results']], ['created', 'error', 'created'])
+        self.assertIn('Insufficient stock for Ink. Available: 1', str(response.data['results'][1]['errors']))
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(self.stock(), {'Ink': 0, 'Pen': 6})
+        self.assertEqual(self.sales(), [('Ink', -3), ('Ink', -1), ('Pen', -4)])
+
+    def test_bulk_body_must_be_an_array(self):
+        for body in (5, 'x', {'customer': self.customer.pk}):
+            response = self.client.post('/sales/orders/bulk/', body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn('Expected a JSON array', str(response.data))
+
+
+@override_settings(AUDIT_LOG_ASYNC=False)
+class CancelOrderTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(User.objects.create_user('manager', password='x', role='manager'))
+        self.customer = Customer.objects.create(name='Acme', phone='01711000000')
+        self.pen = Product.objects.create(name='Pen', purchase_price=5, selling_price=10, quantity=10, min_stock_level=2)
+        self.ink = Product.objects.create(name='Ink', purchase_price=2, selling_price=3, quantity=4, min_stock_level=1)
+
+    def place(self, *items):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/sales/orders/', {
+                'customer': self.customer.pk,
+                'payment_status': 'unpaid',
+                'items': [{'product': product.pk, 'quantity': quantity} for product, quantity in items],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.data['id'])
+
+    def cancel(self, order):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(f'/sales/orders/{order.pk}/', {'payment_status': 'cancelled'}, format='json')
+
+    def day(self):
+        return DailySalesRollup.objects.get(product__isnull=True)
+
+    def test_stock_is_restored_through_the_ledger(self):
+        order = self.place((self.pen, 3), (self.ink, 1), (self.pen, 2))
+        response = self.cancel(order)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Product.objects.get(pk=self.pen.pk).quantity, 10)
+        self.assertEqual(Product.objects.get(pk=self.ink.pk).quantity, 4)
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(kind='cancellation').values_list('product__name', 'quantity', 'reference')),
+            [('Ink', 1, order.invoice_id), ('Pen', 5, order.invoice_id)]
+        )
+
+    def test_rollups_and_dashboard_reflect_the_cancellation(self):
+        self.place((self.pen, 3))
+        order = self.place((self.ink, 2))
+        self.assertEqual(self.client.get('/sales/dashboard/stats/').data['cancelled_orders_today'], 0)
+
+        self.cancel(order)
+        day = self.day()
+        self.assertEqual((day.order_count, day.unpaid_count, day.cancelled_count), (2, 1, 1))
+        response = self.client.get('/sales/dashboard/stats/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['cancelled_orders_today'], 1)
+        self.assertEqual(response.data['pending_orders'], 1)
+
+    def test_cancelling_twice_is_rejected(self):
+        order = self.place((self.pen, 3))
+        self.assertEqual(self.cancel(order).status_code, 200)
+        response = self.cancel(order)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already cancelled', str(response.data))
+        self.assertEqual(Product.objects.get(pk=self.pen.pk).quantity, 10)
+        self.assertEqual(StockMovement.objects.filter(kind='cancellation').count(), 1)
+        self.assertEqual(self.day().cancelled_count, 1)
+
+    def test_paid_order_cannot_be_cancelled(self):
+        order = self.place((self.pen, 3))
+        Order.objects.filter(pk=order.pk).update(payment_status='paid')
+        self.assertEqual(self.cancel(order).status_code, 400)
+        self.assertEqual(Product.objects.get(pk=self.pen.pk).quantity, 7)
+
+    def test_queries_do_not_grow_with_lines(self):
+        counts = []
+        for items in ([(self.pen, 1)], [(self.pen, 1), (self.ink, 1), (self.pen, 2)]):
+            order = self.place(*items)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.cancel(order).status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertLessEqual(counts[1], 20)
+
+
+class SalesRollupTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user('manager', password='x', role='manager'))
+        self.customer = Customer.objects.create(name='Acme', phone='01711000000')
+        self.pen = Product.objects.create(name='Pen', purchase_price=5, selling_price=10, quantity=50, min_stock_level=2)
+        self.ink = Product.objects.create(name='Ink', purchase_price=2, selling_price=3, quantity=50, min_stock_level=1)
+
+    def order(self, status, *items):
+        return {
+            'customer': self.customer.pk,
+            'payment_status': status,
+            'items': [{'product': product.pk, 'quantity': quantity} for product, quantity in items],
+        }
+
+    def rows(self):
+        return sorted(DailySalesRollup.objects.values_list(
+            'date', 'product', 'order_count', 'paid_count', 'unpaid_count', 'cancelled_count',
+            'quantity_sold', 'sales_total', 'cost_total', 'profit_total'
+        ), key=lambda row: (row[0], row[1] or 0))
+
+    def test_incremental_rows_match_a_rebuild(self):
+        self.client.post('/sales/orders/', self.order('paid', (self.pen, 2), (self.ink, 1), (self.pen, 1)), format='json')
+        self.client.post('/sales/orders/bulk/', [
+            self.order('unpaid', (self.ink, 4)), self.order('unpaid', (self.pen, 3)),
+        ], format='json')
+        cancelled, deleted = Order.objects.filter(payment_status='unpaid').order_by('id')
+        self.assertEqual(self.client.patch(
+            f'/sales/orders/{cancelled.pk}/', {'payment_status': 'cancelled'}, format='json'
+        ).status_code, 200)
+        self.assertEqual(self.client.delete(f'/sales/orders/{deleted.pk}/').status_code, 204)
+
+        day = DailySalesRollup.objects.get(product__isnull=True)
+        self.assertEqual(
+            (day.order_count, day.paid_count, day.unpaid_count, day.cancelled_count, day.sales_total),
+            (2, 1, 0, 1, sum(order.total_amount for order in Order.objects.all()))
+        )
+        self.assertEqual(day.sales_total, 45)
+        self.assertEqual(day.profit_total, 20)
+
+        incremental = self.rows()
+        rebuild()
+        self.assertEqual(self.rows(), incremental)
+
+
+class DashboardCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(User.objects.create_user('manager', password='x', role='manager'))
+        self.customer = Customer.objects.create(name='Acme', phone='01711000000')
+        self.pen = Product.objects.create(name='Pen', purchase_price=5, selling_price=10, quantity=10, min_stock_level=2)
+
+    def stats(self):
+        return self.client.get('/sales/dashboard/stats/')
+
+    def test_second_request_is_a_hit(self):
+        self.assertEqual(self.stats()['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.stats()
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_order_write_invalidates(self):
+        self.assertEqual(self.stats().data['pending_orders'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/sales/orders/', {
+                'customer': self.customer.pk, 'payment_status': 'unpaid', 'items': [{'product': self.pen.pk, 'quantity': 1}],
+            }, format='json')
+        response = self.stats()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['pending_orders'], 1)
+
+    def test_uncommitted_write_keeps_the_cache(self):
+        self.stats()
+        with self.captureOnCommitCallbacks(execute=False):
+            Order.objects.create(customer=self.customer)
+        self.assertEqual(self.stats()['X-Cache'], 'HIT')
+
+
+class InvoiceNumberTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Acme', phone='01711000000')
+
+    def create(self, when=None):
+        with mock.patch('django.utils.timezone.now', return_value=when or datetime(2026, 6, 1, tzinfo=dt_timezone.utc)):
+            return Order.objects.create(customer=self.customer).invoice_id
+
+    def test_rolled_back_orders_leave_no_gap(self):
+        first = self.create()
+        try:
+            with transaction.atomic():
+                self.create()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual([first, self.create(), self.create()], ['INV-2026-0001', 'INV-2026-0002', 'INV-2026-0003'])
+
+    def test_numbering_restarts_each_year(self):
+        ids = [
+            self.create(datetime(2026, 12, 31, 23, 59, 59, tzinfo=dt_timezone.utc)),
+            self.create(datetime(2027, 1, 1, tzinfo=dt_timezone.utc)),
+            self.create(datetime(2027, 1, 1, 0, 0, 1, tzinfo=dt_timezone.utc)),
+        ]
+        self.assertEqual(ids, ['INV-2026-0001', 'INV-2027-0001', 'INV-2027-0002'])
+        self.assertEqual(dict(InvoiceSequence.objects.values_list('year', 'last_number')), {2026: 1, 2027: 2})
+
+    def test_numbers_past_9999(self):
+        InvoiceSequence.objects.create(year=2026, last_number=9998)
+        self.assertEqual([self.create(), self.create()], ['INV-2026-9999', 'INV-2026-10000'])
+        #invoice_number keeps the order the strings lose
+        self.assertEqual(
+            list(Order.objects.order_by('-invoice_number').values_list('invoice_id', flat=True)),
+            ['INV-2026-10000', 'INV-2026-9999']
+        )
+
+
+class BackfillOrderCostsTests(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(name='Acme', phone='01711000000')
+        self.pen = Product.objects.create(name='Pen', purchase_price=5, selling_price=10, quantity=50, min_stock_level=2)
+        self.ink = Product.objects.create(name='Ink', purchase_price=2, selling_price=3, quantity=50, min_stock_level=1)
+        self.order = Order.objects.create(customer=customer)
+        for product, quantity, price in ((self.pen, 3, 10), (self.ink, 2, 3), (self.pen, 1, 9)):
+            OrderItem.objects.create(order=self.order, product=product, quantity=quantity, price=price)
+
+    def test_fills_missing_costs_and_profit(self):
+        #Items written before costs were captured, and one that kept its cost but lost the profit
+        pen_lines = OrderItem.objects.filter(product=self.pen).order_by('id')
+        OrderItem.objects.exclude(pk=pen_lines[1].pk).update(unit_cost=None, line_profit=None)
+        OrderItem.objects.filter(pk=pen_lines[1].pk).update(unit_cost=4, line_profit=None)
+        Product.objects.filter(pk=self.pen.pk).update(purchase_price=6)
+
+        out = StringIO()
+        call_command('backfill_order_costs', '--batch-size', '2', '--rebuild-rollup', stdout=out)
+        self.assertIn('Captured cost for 2 order items', out.getvalue())
+        self.assertEqual(
+            list(OrderItem.objects.order_by('id').values_list('unit_cost', 'line_profit')),
+            [(6, 12), (2, 2), (4, 5)]
+        )
+        self.assertEqual(DailySalesRollup.objects.get(product__isnull=True).profit_total, 19)
+
+
+class BenchmarkCommandTests(TestCase):
+    def seed(self):
+        call_command(
+            'seed_benchmark_data', '--users', '3', '--customers', '20', '--products', '10', '--orders', '30',
+            '--audit-logs', '10', '--days', '30', '--batch-size', '7', stdout=StringIO()
+        )
+
+    def test_seed(self):
+        self.seed()
+        self.assertEqual(User.objects.filter(username__startswith='bench_').count(), 3)
+        self.assertEqual(
+            (Customer.objects.count(), Product.objects.count(), Order.objects.count(), AuditLog.objects.count()),
+            (20, 10, 30, 10)
+        )
+        self.assertFalse(OrderItem.objects.filter(line_profit__isnull=True).exists())
+        self.assertEqual(verify_snapshots(), [])
+        self.assertEqual(
+            DailySalesRollup.objects.filter(product__isnull=True).aggregate(total=Sum('sales_total'))['total'],
+            Order.objects.aggregate(total=Sum('total_amount'))['total']
+        )
+        #Orders placed afterwards carry on from the seeded invoice numbers
+        numbers = list(Order.objects.values_list('invoice_id', flat=True))
+        self.assertEqual(len(set(numbers)), 30)
+        self.assertNotIn(Order.objects.create(customer=Customer.objects.first()).invoice_id, numbers)
+
+    def test_run_benchmarks(self):
+        self.seed()
+        orders = Order.objects.count()
+        out = StringIO()
+        call_command(
+            'run_benchmarks', '--iterations', '2', '--warmup', '0', '--only', 'order_create', 'order_list', 'dashboard',
+            stdout=out, stderr=StringIO()
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['meta']['rows']['orders'], orders)
+        results = {result['name']: result for result in report['results']}
+        self.assertEqual(list(results), ['order_create', 'order_list', 'dashboard'])
+        self.assertEqual(results['order_create']['status_codes'], [201])
+        self.assertEqual(results['order_list']['status_codes'], [200])
+        self.assertGreater(results['order_list']['queries_p50'], 0)
+        self.assertEqual(Order.objects.count(), orders)  #Writes are rolled back
+
+    def test_run_benchmarks_needs_seeded_data(self):
+        with self.assertRaisesMessage(CommandError, 'run seed_benchmark_data first'):
+            call_command('run_benchmarks', stdout=StringIO(), stderr=StringIO())
+        self.seed()
+        with self.assertRaisesMessage(CommandError, 'Unknown benchmarks: nope'):
+            call_command('run_benchmarks', '--only', 'nope', stdout=StringIO(), stderr=StringIO())
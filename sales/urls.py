@@ -8,4 +8,5 @@ router.register(r'orders', views.OrderViewSet, basename='order')
 urlpatterns = [
     path('', include(router.urls)),
     path('dashboard/stats/', views.DashboardView.as_view(), name='dashboard-stats'),
+    path('dashboard/cache-stats/', views.DashboardCacheStatsView.as_view(), name='dashboard-cache-stats'),
 ]
\ No newline at end of file
@@ -1,24 +1,38 @@
-import csv
+import tempfile
+import types
 from datetime import datetime
-from io import BytesIO
-
-from django.db.models import Sum, F, Count, ExpressionWrapper, DecimalField
-from django.db.models.functions import TruncDate
-from django.http import HttpResponse
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from rest_framework import viewsets, filters
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum, F, Q, Count, DecimalField, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce, TruncDate
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
+from django.utils import timezone
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 import django_filters
 
-from .models import Order, OrderItem
+from .invoices import invoice_cache, invoice_etag, invoice_payload, render_invoice_pdf, stream_invoice_zip
+from .exports import EXCEL_CONTENT_TYPE, ExportContentNegotiation, csv_lines, measure_export, write_excel
+from .cache import dashboard_cache_stats, get_dashboard, set_dashboard
+from .models import DailySalesRollup, Order, OrderItem
+from .parsers import NDJSONParser
+from .rollups import record_orders, record_status_change
+from .services import cancel_order, place_orders
 from accounts.models import User
+from core.dates import day_bounds
+from core.metrics import metrics
+from core.search import FullTextSearchFilter
+from customers.models import Customer
 
 from .serializers import (
+    BulkOrderSerializer,
     OrderCreateSerializer,
     OrderUpdateSerializer,
     OrderListSerializer,
@@ -28,25 +42,55 @@ from inventory.permissions import IsStaffOrManager, IsManager
 
 
 class OrderFilter(django_filters.FilterSet):
-    start_date = django_filters.DateFilter(field_name='created_at', lookup_expr='gte')
-    end_date = django_filters.DateFilter(field_name='created_at', lookup_expr='lte')
+    #Local days turned into a created_at range, so the (created_at, id) indexes apply
+    start_date = django_filters.DateFilter(method='filter_start_date')
+    end_date = django_filters.DateFilter(method='filter_end_date')
 
     class Meta:
         model = Order
         fields = ['payment_status', 'start_date', 'end_date']
 
+    def filter_start_date(self, queryset, name, value):
+        lower, _ = day_bounds(start=value)
+        return queryset.filter(created_at__gte=lower)
+
+    def filter_end_date(self, queryset, name, value):
+        #The whole end day is included
+        _, upper = day_bounds(end=value)
+        return queryset.filter(created_at__lt=upper)
+
 
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().order_by('-created_at')
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    queryset = Order.objects.all().order_by('-created_at', '-id')
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
     filterset_class = OrderFilter
     search_fields = ['customer__name', 'customer__phone', 'invoice_id']
+    search_index = 'sales_order_fts'
 
     def get_permissions(self):
         if self.action == 'destroy':
             return [IsManager()]
         return [IsStaffOrManager()]
 
+    #Shape the query for what each action's serializer reads, so nothing is fetched per row
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            #Counted per row of the page, a Count join would group every order before the LIMIT
+            items_count = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+                count=Count('id')
+            ).values('count')
+            return queryset.select_related('customer').annotate(
+                items_count=Coalesce(Subquery(items_count, output_field=IntegerField()), 0)
+            )
+        if self.action == 'retrieve':
+            return queryset.select_related('customer', 'created_by').prefetch_related(
+                Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+            ).annotate(profit=Sum('items__line_profit'))
+        if self.action == 'generate_invoice':
+            return queryset.select_related('customer')
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'create':
             return OrderCreateSerializer
@@ -58,130 +102,250 @@ class OrderViewSet(viewsets.ModelViewSet):
     
     #For cancelled orders
     def perform_update(self, serializer):
-        old_instance = self.get_object()
-        old_status = old_instance.payment_status
-        new_status = serializer.validated_data.get('payment_status')
-        
-        # Prevent cancelling paid orders
-        if old_status == 'paid' and new_status == 'cancelled':
-            from rest_framework.exceptions import ValidationError
-            raise ValidationError({"error": "Cannot cancel a paid order"})
-        
-        # Save the update
-        instance = serializer.save()
-        
-        # Check if order was just cancelled
-        if old_status != 'cancelled' and new_status == 'cancelled':
-            # Restore inventory for each item
-            from inventory.models import Product, AuditLog
-            
-            for item in instance.items.all():
-                product = item.product
-                product.quantity += item.quantity  # Add back the quantity
-                product.save()
-                
-                # Create audit log
-                AuditLog.objects.create(
-                    product=product,
-                    action=f"Stock increased by {item.quantity} due to order #{instance.invoice_id} cancellation",
-                    changed_by=self.request.user
-                )
-
-
-    #Generate and download PDF invoice for an order
+        instance = serializer.instance
+
+        with transaction.atomic():
+            #Re-read the status under a row lock so two concurrent cancellations cannot both restore stock
+            old_status = Order.objects.select_for_update().values_list(
+                'payment_status', flat=True
+            ).get(pk=instance.pk)
+            new_status = serializer.validated_data.get('payment_status', old_status)
+
+            # Prevent cancelling paid orders
+            if old_status == 'paid' and new_status == 'cancelled':
+                raise ValidationError({"error": "Cannot cancel a paid order"})
+            if old_status == 'cancelled' and new_status == 'cancelled':
+                raise ValidationError({"error": "Order is already cancelled"})
+
+            # Save the update
+            instance = serializer.save()
+
+            # Check if order was just cancelled, then restore inventory in one go
+            if old_status != 'cancelled' and new_status == 'cancelled':
+                cancel_order(instance, self.request.user)
+
+            record_status_change(instance, old_status, instance.payment_status)
+
+        invoice_cache.invalidate(instance.pk)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            record_orders([instance], sign=-1)  #Take the order back out of the sales rollup
+            order_id = instance.pk
+            instance.delete()
+        invoice_cache.invalidate(order_id)
+
+
+    #Upload many orders at once (POS terminals syncing after being offline).
+    #Body is a JSON array or NDJSON, one order per line.
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk_upload(self, request):
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', settings.BULK_ORDER_CHUNK_SIZE))
+        except ValueError:
+            raise ValidationError({"chunk_size": "Must be a number"})
+        chunk_size = max(1, min(chunk_size, settings.BULK_ORDER_MAX_CHUNK_SIZE))
+
+        orders = request.data
+        #A JSON array, or the generator NDJSONParser returns
+        if not isinstance(orders, (list, types.GeneratorType)):
+            raise ValidationError({"error": "Expected a JSON array or NDJSON body"})
+
+        results = []
+        chunk = []
+        for index, raw in enumerate(orders):
+            chunk.append((index, raw))
+            if len(chunk) >= chunk_size:
+                results.extend(self._create_order_chunk(chunk))
+                chunk = []
+        if chunk:
+            results.extend(self._create_order_chunk(chunk))
+
+        created = sum(1 for result in results if result['status'] == 'created')
+        if created == len(results):
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results,
+        }, status=response_status)
+
+    #Validate and create one chunk of uploaded orders in a single transaction
+    def _create_order_chunk(self, chunk):
+        results = {}
+        valid = []
+        for index, raw in chunk:
+            if isinstance(raw, ParseError):
+                results[index] = {'index': index, 'status': 'error', 'errors': raw.detail}
+                continue
+            serializer = BulkOrderSerializer(data=raw)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+
+        #One customer lookup for the whole chunk, products are looked up in place_orders()
+        customers = Customer.objects.in_bulk({data['customer'] for _, data in valid})
+        orders_data = []
+        indexes = []
+        for index, data in valid:
+            if data['customer'] not in customers:
+                results[index] = {'index': index, 'status': 'error',
+                                  'errors': {'customer': [f"Invalid customer id: {data['customer']}"]}}
+                continue
+            orders_data.append({**data, 'customer': customers[data['customer']]})
+            indexes.append(index)
+
+        if orders_data:
+            try:
+                with transaction.atomic():
+                    orders, errors = place_orders(orders_data, self.request.user)
+            except ValidationError as exc:
+                #Lost a stock race, nothing from this chunk was written
+                orders, errors = [], {position: exc.detail[0] for position in range(len(orders_data))}
+
+            created = iter(orders)
+            for position, index in enumerate(indexes):
+                if position in errors:
+                    results[index] = {'index': index, 'status': 'error', 'errors': {'items': [errors[position]]}}
+                else:
+                    order = next(created)
+                    results[index] = {'index': index, 'status': 'created', 'id': order.pk, 'invoice_id': order.invoice_id}
+
+        return [results[index] for index, _ in chunk]
+
+    #Generate and download PDF invoice for an order.
+    #Rendered PDFs are cached on disk by content hash, which is also the ETag.
     @action(detail=True, methods=['get'], url_path='invoice-pdf')
     def generate_invoice(self, request, pk=None):
         order = self.get_object()
 
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        elements = []
-
-        # Header info
-        elements.append(Paragraph(f"Invoice: {order.invoice_id}", styles['Title']))
-        elements.append(Spacer(1, 10))
-        elements.append(Paragraph(f"Customer: {order.customer.name}", styles['Normal']))
-        elements.append(Paragraph(f"Phone: {order.customer.phone}", styles['Normal']))
-        elements.append(Paragraph(f"Date: {order.created_at.strftime('%Y-%m-%d %H:%M')}", styles['Normal']))
-        elements.append(Paragraph(f"Payment Status: {order.get_payment_status_display()}", styles['Normal']))
-        elements.append(Spacer(1, 20))
-
-        # Items table
-        table_data = [['Product', 'Quantity', 'Unit Price', 'Subtotal']]
-        for item in order.items.all():
-            table_data.append([
-                item.product.name,
-                str(item.quantity),
-                f"${item.price:.2f}",
-                f"${(item.price * item.quantity):.2f}"
-            ])
-        table_data.append(['', '', 'Total:', f"${order.total_amount:.2f}"])
-
-        table = Table(table_data)
-        elements.append(table)
-
-        doc.build(elements)
-        buffer.seek(0)
-
-        response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+        payload = invoice_payload(order, order.items.select_related('product'))
+        etag = invoice_etag(payload)
+        quoted_etag = quote_etag(etag)
+
+        #If-None-Match uses the weak comparison, a W/ prefix added on the way (e.g. by gzip) still matches
+        if_none_match = {tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))}
+        if quoted_etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+            response['ETag'] = quoted_etag
+            return response
+
+        pdf = invoice_cache.get(order.pk, etag)
+        if pdf is None:
+            pdf = render_invoice_pdf(payload)
+            invoice_cache.put(order.pk, etag, pdf)
+            metrics.inc('invoice_pdf_renders_total')
+
+        response = HttpResponse(pdf, content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="Invoice_{order.invoice_id}.pdf"'
+        response['ETag'] = quoted_etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    #Download the invoices of many orders as one ZIP, selected with ?ids=1,2,3 or the usual filters
+    @action(detail=False, methods=['get'], url_path='invoices-zip')
+    def invoices_zip(self, request):
+        orders = self.filter_queryset(self.get_queryset())
+        ids = request.query_params.get('ids')
+        if ids:
+            try:
+                orders = orders.filter(pk__in=[int(pk) for pk in ids.split(',') if pk.strip()])
+            except ValueError:
+                raise ValidationError({"ids": "Must be a comma separated list of order ids"})
+        if orders[:settings.INVOICE_ZIP_MAX_ORDERS + 1].count() > settings.INVOICE_ZIP_MAX_ORDERS:
+            raise ValidationError({
+                "error": f"At most {settings.INVOICE_ZIP_MAX_ORDERS} invoices per download, narrow the selection"
+            })
+
+        #Orders, items and products in three queries, read in chunks as the archive is written
+        orders = orders.select_related('customer').prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        )
+        payloads = (
+            (order.pk, invoice_payload(order, order.items.all()))
+            for order in orders.iterator(chunk_size=500)
+        )
+
+        response = StreamingHttpResponse(stream_invoice_zip(payloads), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="invoices.zip"'
         return response
 
-    @action(detail=False, methods=['get'], url_path='export')
+    #report -> (sheet title, column headers, method yielding the rows)
+    EXPORT_REPORTS = {
+        'total_summary': (
+            'Total Summary', ['Date', 'Total Orders', 'Total Sales ($)', 'Total Profit ($)'], '_get_total_summary_data'
+        ),
+        'customer_wise': (
+            'Customer Wise', ['Customer Name', 'Phone', 'Total Orders', 'Total Spent ($)'], '_get_customer_wise_data'
+        ),
+    }
+
+    @action(detail=False, methods=['get'], url_path='export', content_negotiation_class=ExportContentNegotiation)
     def export_orders(self, request):
         export_format = request.query_params.get('format', 'csv')
         report_type = request.query_params.get('report', 'total_summary')
+        if report_type not in self.EXPORT_REPORTS:
+            raise ValidationError({"report": f"Choose one of: {', '.join(self.EXPORT_REPORTS)}"})
 
-        if report_type == 'total_summary':
-            headers = ['Date', 'Total Orders', 'Total Sales ($)', 'Total Profit ($)']
-            data = self._get_total_summary_data()
-        else:  # customer_wise
-            headers = ['Customer Name', 'Phone', 'Total Orders', 'Total Spent ($)']
-            data = self._get_customer_wise_data()
-
+        #Only known reports get this far, report_type also labels the export_size_bytes metric
+        title, headers, rows = self.EXPORT_REPORTS[report_type]
+        data = getattr(self, rows)()
         if export_format == 'excel':
-            return self._export_excel(headers, data, report_type)
+            return self._export_excel(headers, data, report_type, title)
         return self._export_csv(headers, data, report_type)
 
+    #One grouped query for orders, sales and profit per day, read in chunks while the response is written.
+    #Sales are summed from the items (price * quantity), which add up to each order's total_amount.
     def _get_total_summary_data(self):
-        daily_orders = Order.objects.annotate(
-            date=TruncDate('created_at')
+        daily_orders = OrderItem.objects.annotate(
+            date=TruncDate('order__created_at')
         ).values('date').annotate(
-            total_orders=Count('id'),
-            total_sales=Sum('total_amount')
+            total_orders=Count('order', distinct=True),
+            total_sales=Sum(F('price') * F('quantity'), output_field=DecimalField()),
+            total_profit=Sum('line_profit')     #Snapshot at order time, no join to Product
         ).order_by('-date')
 
-        data = []
-        for row in daily_orders:
-            profit = OrderItem.objects.filter(
-                order__created_at__date=row['date']
-            ).aggregate(
-                total=Sum(
-                    ExpressionWrapper(
-                        (F('price') - F('product__purchase_price')) * F('quantity'),
-                        output_field=DecimalField()
-                    )
-                )
-            )['total'] or 0
-
-            data.append([
-                str(row['date']),
-                row['total_orders'],
-                f"{row['total_sales']:.2f}",
-                f"{profit:.2f}"
-            ])
-        return data
+        for row in daily_orders.iterator(chunk_size=2000):
+            yield [row['date'], row['total_orders'], row['total_sales'], row['total_profit'] or 0]
+
+    #One query over Order grouped by customer
+    def _get_customer_wise_data(self):
+        customers = Order.objects.values(
+            'customer', 'customer__name', 'customer__phone'
+        ).annotate(
+            total_orders=Count('id'),
+            total_spent=Sum('total_amount')
+        ).order_by('-total_spent', 'customer')
+
+        for row in customers.iterator(chunk_size=2000):
+            yield [row['customer__name'], row['customer__phone'], row['total_orders'], row['total_spent'] or 0]
 
 
+    #Rows are written one at a time as the client reads, memory stays flat for any export size
     def _export_csv(self, headers, data, report_type):
-        response = HttpResponse(content_type='text/csv')
+        lines = measure_export(csv_lines(headers, data), report_type, 'csv')
+        response = StreamingHttpResponse(lines, content_type='text/csv')
         response['Content-Disposition'] = f'attachment; filename="{report_type}_report.csv"'
-        writer = csv.writer(response)
-        writer.writerow(headers)
-        writer.writerows(data)
         return response
 
+    #The workbook is built on disk in write-only mode and streamed from there
+    def _export_excel(self, headers, data, report_type, title):
+        output = tempfile.TemporaryFile()
+        write_excel(headers, data, title, output)
+        metrics.observe('export_size_bytes', output.tell(), report=report_type, format='excel')
+        output.seek(0)
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f"{report_type}_report.xlsx",
+            content_type=EXCEL_CONTENT_TYPE
+        )
+
 
 
 class DashboardView(APIView):
@@ -201,66 +365,51 @@ class DashboardView(APIView):
             is_date_range = (start_date != end_date)    #is_date_range = True
 
             if is_date_range:   #if start_date is not equal to end date so there's a date range
-                today = datetime.now().date()
+                today = timezone.localdate()
             else:
                 today = start
 
         else:   #No filter condition
-            today = datetime.now().date()
+            today = timezone.localdate()
             is_date_range = False
             start, end = None, None
 
-
-        ### Today's data
-        best_selling_product_today = OrderItem.objects.filter(
-            order__created_at__date=today
+        #Polls with the same role and dates are answered from the cache, without touching the database
+        cached = get_dashboard(request.user.role, today, start, end)
+        if cached is not None:
+            return Response(cached, headers={'X-Cache': 'HIT'})
+
+
+        #Everything below reads the pre-aggregated DailySalesRollup, never the raw order tables
+        day_totals = DailySalesRollup.objects.filter(product__isnull=True)
+        is_today = Q(date=today)
+        #Without a date range the overall figures are all time
+        in_period = {'filter': Q(date__gte=start, date__lte=end)} if is_date_range else {}
+
+        totals = day_totals.aggregate(
+            paid_orders_today=Sum('paid_count', filter=is_today),
+            total_sales_today=Sum('sales_total', filter=is_today),
+            cancelled_orders_today=Sum('cancelled_count', filter=is_today),
+            total_profit_today=Sum('profit_total', filter=is_today),
+            pending_orders=Sum('unpaid_count'),     #Always all time
+            total_cancelled_orders=Sum('cancelled_count', **in_period),
+            overall_profit=Sum('profit_total', **in_period),
+        )
+
+        best_selling_product_today = list(DailySalesRollup.objects.filter(
+            date=today, product__isnull=False
         ).values(
             'product__id', 'product__name'
-        ).annotate(total_sold=Sum('quantity'))
-
-        paid_orders_today = Order.objects.filter(
-            created_at__date=today, payment_status='paid').count()
-
-        total_sales_today = Order.objects.filter(
-            created_at__date=today
-        ).aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-
-        cancelled_orders_today = Order.objects.filter(
-            created_at__date=today, payment_status='cancelled').count()
-
-
-        ### Overall (all time) data
-
-        #These are always all time data
-        pending_orders = Order.objects.filter(
-            payment_status='unpaid'
-        ).count()
+        ).annotate(total_sold=Sum('quantity_sold')).order_by('-total_sold'))
 
         total_active_users = User.objects.filter(is_active=True).count()
-        
-        #These depend on whether we have a date range or not
-        if is_date_range:
-            total_cancelled_orders = Order.objects.filter(
-                payment_status='cancelled',
-                created_at__date__gte=start,
-                created_at__date__lte=end
-                ).count()
-        else:
-            best_selling_product_today = OrderItem.objects.filter(
-            order__created_at__date=today
-            ).values(
-                'product__id', 'product__name'
-            ).annotate(total_sold=Sum('quantity'))
-            total_cancelled_orders =  Order.objects.filter(payment_status='cancelled').count()
 
         #These are always current state
         from inventory.models import Product
-        low_stock_products = Product.objects.filter(
+        low_stock_products = list(Product.objects.filter(
             is_active = True,
-            quantity__lt=F('min_stock_level')   #When quantity is less than(lt) min stock level
-            ).values('id', 'name', 'quantity')
+            is_low_stock = True   #Maintained flag, quantity < min_stock_level
+            ).order_by('id').values('id', 'name', 'quantity'))
         
         # deleted_products = Product.objects.filter(
         #     is_active = False,
@@ -269,11 +418,11 @@ class DashboardView(APIView):
 
         data = {
             'best_selling_product_today': best_selling_product_today,
-            'paid_orders_today': paid_orders_today,
-            'total_sales_today': float(total_sales_today),
-            'cancelled_orders_today': cancelled_orders_today,
-            'pending_orders': pending_orders,
-            'total_cancelled_orders': total_cancelled_orders,
+            'paid_orders_today': totals['paid_orders_today'] or 0,
+            'total_sales_today': float(totals['total_sales_today'] or 0),
+            'cancelled_orders_today': totals['cancelled_orders_today'] or 0,
+            'pending_orders': totals['pending_orders'] or 0,
+            'total_cancelled_orders': totals['total_cancelled_orders'] or 0,
             'total_active_users': total_active_users,
             'low_stock_products': low_stock_products,
             # 'deleted_products': deleted_products,
@@ -282,44 +431,16 @@ class DashboardView(APIView):
 
         # Only managers see profit
         if request.user.role == 'manager':
-            #Today's profit
-            total_profit = OrderItem.objects.filter(
-                order__created_at__date=today
-            ).aggregate(
-                profit=Sum(
-                    ExpressionWrapper(
-                        (F('price') - F('product__purchase_price')) * F('quantity'),
-                        output_field=DecimalField()
-                    )
-                )
-            )['profit'] or 0
-            data['total_profit_today'] = float(total_profit)
-
+            data['total_profit_today'] = float(totals['total_profit_today'] or 0)
             #Overall profit (all-time or date range)
-            if is_date_range:
-                #Profit within date range
-                overall_profit = OrderItem.objects.filter(
-                    order__created_at__date__gte=start,
-                    order__created_at__date__lte=end_date
-                ).aggregate(
-                    profit=Sum(
-                        ExpressionWrapper(
-                            (F('price') - F('product__purchase_price')) * F('quantity'),
-                            output_field=DecimalField()
-                        )
-                    )
-                )['profit'] or 0
-            
-            else:
-                #All time profit
-                overall_profit = OrderItem.objects.aggregate(
-                    profit=Sum(
-                        ExpressionWrapper(
-                            (F('price') - F('product__purchase_price')) * F('quantity'),
-                            output_field=DecimalField()
-                        )
-                    )
-                )['profit'] or 0
-            data['overall_profit'] = float(overall_profit)
-
-        return Response(data)
+            data['overall_profit'] = float(totals['overall_profit'] or 0)
+
+        set_dashboard(request.user.role, today, start, end, data)
+        return Response(data, headers={'X-Cache': 'MISS'})
+
+
+class DashboardCacheStatsView(APIView):
+    permission_classes = [IsManager]
+
+    def get(self, request):
+        return Response(dashboard_cache_stats())